@@ -0,0 +1,11 @@
+# -*- coding: utf-8 -*-
+
+# Programs power supplies from CSV profiles.
+#
+# The core (profiles, compiler, scheduler, supply, transport, engine) only
+# needs the standard library, with pyserial to open a port and NumPy, if
+# installed, to expand profiles faster; both are imported when first used.
+# The graphical interface is in gui and the command line one in cli:
+#
+#   python3 -m interfont                 graphical interface
+#   python3 -m interfont CONFIG PROFILE  play a profile (see cli)
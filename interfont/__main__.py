@@ -0,0 +1,18 @@
+# -*- coding: utf-8 -*-
+
+import sys
+
+
+def main(argv=None):
+    # Without arguments open the graphical interface, otherwise run the
+    # command line one. Only the interface used is imported.
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv:
+        from . import gui
+        return gui.main()
+    from . import cli
+    return cli.main(argv)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Playback benchmark against the simulated supply of simulator.py, so timing
+# changes can be checked on any Linux box:
+#
+#   python3 -m interfont.bench --seconds 10 --latency 5 --jitter 2
+#
+# For each profile it reports the commands sent per second, the CPU used by
+# the playing process and how late the setpoints were written.
+
+import argparse
+import bisect
+import json
+import math
+import multiprocessing
+import os
+import time
+
+from . import compiler, engine, simulator
+from .profiles import load_profile
+from .timing import percentile
+
+# The repository, with the sample profiles and configurations
+HERE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def synthetic(step, seconds):
+    # A 1 Hz sine between 0 and 10 V sampled every step seconds.
+    n = int(seconds/step)
+    ts = [i*step for i in range(n)]
+    vs = [5 + 5*math.sin(2*math.pi*t) for t in ts]
+    return ts, vs
+
+
+def profiles(config, seconds):
+    min_trans = float(config["sleeptime"])/1000
+    yield ("pwl.csv (ramps)",
+           load_profile(os.path.join(HERE, 'pwl.csv'), True, min_trans))
+    yield ("current_profile.csv",
+           load_profile(os.path.join(HERE, 'current_profile.csv')))
+    yield "synthetic 10 ms steps", synthetic(0.01, seconds)
+    yield "synthetic 1 ms steps", synthetic(0.001, seconds)
+
+
+def truncate(ts, vs, seconds, speed):
+    # The first `seconds` of the profile, played `speed` times faster.
+    n = bisect.bisect_right(ts, seconds*speed)
+    return [t/speed for t in ts[:n]], list(vs[:n])
+
+
+def start_simulator(args):
+    ctx = multiprocessing.get_context('fork')
+    conn, child = ctx.Pipe()
+    p = ctx.Process(target=simulator.serve, args=(child,),
+                    kwargs={"latency": args.latency/1000,
+                            "jitter": args.jitter/1000,
+                            "drop": args.drop,
+                            "seed": 0},
+                    daemon=True)
+    p.start()
+    return p, conn, conn.recv()
+
+
+def run_case(name, ts, vs, config, args):
+    # The simulator runs in a child process, so the CPU time measured here
+    # is only that of the playing side.
+    p, conn, port = start_simulator(args)
+    config = dict(config, port=port)
+    ser = engine.open_serial(config)
+    s = engine.make_supply(config, ser, lambda text: None)
+    try:
+        s.setup()
+        cpu = time.process_time()
+        wall = time.monotonic()
+        if args.compiled:
+            s.runcompiled(compiler.compile_series(ts, vs, config["pvsyntax"]))
+        else:
+            s.runseries(ts, vs)
+        if s.transport is not None:
+            s.transport.flush()
+        wall = time.monotonic() - wall
+        cpu = time.process_time() - cpu
+    finally:
+        s.close()
+    conn.send('stop')
+    sim = conn.recv()
+    p.join()
+    summary = s.timing.summary()
+    summary.update(name=name, wall=wall, cpu=cpu/wall if wall else 0,
+                   simulator=sim)
+    return summary
+
+
+def format_row(r):
+    ms = lambda x: '   n/a' if math.isnan(x) else '{:6.2f}'.format(x*1000)
+    return ('{:<24} {:>8} {:>7} {:>8.1f} {:>5.1f}% {} {} {} {:>7} {:>7}'
+            .format(r["name"], r["points"], r["sent"],
+                    r["commands_per_second"] if r["sent"] > 1 else 0,
+                    r["cpu"]*100, ms(r["lateness_p50"]),
+                    ms(r["lateness_p99"]), ms(r["lateness_max"]),
+                    r["skipped"], r["replaced"]))
+
+
+HEADER = ('{:<24} {:>8} {:>7} {:>8} {:>6} {:>6} {:>6} {:>6} {:>7} {:>7}'
+          .format('profile', 'points', 'sent', 'cmd/s', 'cpu', 'p50ms',
+                  'p99ms', 'maxms', 'skipped', 'replace'))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark profile playback against a simulated supply.")
+    parser.add_argument("--config",
+                        default=os.path.join(HERE, 'configs',
+                                             'lambdaGEN16-150.json'),
+                        help="supply configuration (default GEN16-150)")
+    parser.add_argument("--seconds", type=float, default=5,
+                        help="seconds of each profile to play (default 5)")
+    parser.add_argument("--speed", type=float, default=1,
+                        help="play the profiles this many times faster")
+    parser.add_argument("--latency", type=float, default=2,
+                        help="simulated reply latency in ms (default 2)")
+    parser.add_argument("--jitter", type=float, default=0,
+                        help="simulated maximum extra latency in ms")
+    parser.add_argument("--drop", type=float, default=0,
+                        help="probability of the simulator ignoring a command")
+    parser.add_argument("--compiled", action="store_true",
+                        help="play compiled profiles")
+    parser.add_argument("--json", metavar="FILE",
+                        help="also save the results as JSON")
+    args = parser.parse_args(argv)
+
+    config = engine.load_config(args.config)
+    results = []
+    print(HEADER)
+    for name, (ts, vs) in profiles(config, args.seconds*args.speed):
+        ts, vs = truncate(ts, vs, args.seconds, args.speed)
+        r = run_case(name, ts, vs, config, args)
+        results.append(r)
+        print(format_row(r))
+    lateness = sorted(r["lateness_p99"] for r in results
+                      if not math.isnan(r["lateness_p99"]))
+    print("Worst p99 lateness: {:.2f} ms".format(
+        percentile(lateness, 100)*1000))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=1)
+
+
+if __name__ == "__main__":
+    main()
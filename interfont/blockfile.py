@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# The append-only files of rows of doubles written during a run, telemetry
+# (telemetry.py) and journals (journal.py). After a header of its own
+# kind, such a file is a sequence of blocks (little endian):
+#
+#   number of rows k, then each column in turn as k doubles
+#
+# Rows are kept in memory and written a block at a time, so a run of any
+# length only keeps one block in memory. A block cut short by a crash is
+# ignored when reading.
+
+import struct
+import sys
+from array import array
+
+BLOCK = struct.Struct('<I')
+
+
+class BlockWriter:
+    # Appends rows of ncolumns values to an open file, one block of up to
+    # block_rows rows at a time.
+
+    def __init__(self, file, ncolumns, block_rows):
+        self.file = file
+        self.block_rows = block_rows
+        self.columns = [array('d') for _ in range(ncolumns)]
+        self.rows = 0 # rows written to the file
+
+    def pending(self):
+        # Rows kept in memory, not written yet
+        return len(self.columns[0])
+
+    def append(self, row):
+        for column, x in zip(self.columns, row):
+            column.append(x)
+        if len(self.columns[0]) >= self.block_rows:
+            self.flush()
+
+    def flush(self):
+        k = len(self.columns[0])
+        if not k or self.file is None:
+            return
+        self.file.write(BLOCK.pack(k))
+        for column in self.columns:
+            if sys.byteorder != 'little':
+                column.byteswap()
+            self.file.write(column.tobytes())
+            del column[:]
+        self.file.flush()
+        self.rows += k
+
+    def close(self):
+        if self.file is not None:
+            self.flush()
+            self.file.close()
+            self.file = None
+
+
+def read_blocks(data, pos, names):
+    # Read the blocks of data (the bytes of a whole file) from pos on.
+    # Returns a dict with an array('d') per column name and the end of the
+    # last complete block.
+    columns = {name: array('d') for name in names}
+    while pos + BLOCK.size <= len(data):
+        k, = BLOCK.unpack_from(data, pos)
+        end = pos + BLOCK.size + 8*k*len(names)
+        if end > len(data):
+            break # incomplete last block
+        pos += BLOCK.size
+        for name in names:
+            columns[name].frombytes(data[pos:pos + 8*k])
+            pos += 8*k
+    if sys.byteorder != 'little':
+        for a in columns.values():
+            a.byteswap()
+    return columns, pos
@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Several Lambda supplies daisy-chained on one serial line (RS-485
+# multi-drop), each answering to the address of the ADR command in its
+# setup_comms. Commands only reach the supply selected by the last ADR, so
+# one scheduler owns the port and plays every profile at once:
+#
+#   python3 -m interfont.cli configs/a.json a.csv \
+#       --also configs/b.json b.csv
+#
+# with both configs on the same port and different ADR addresses.
+
+import heapq
+import queue
+import threading
+import time
+
+from . import drivers
+from .engine import (CYCLE, DONE, ERROR, PROGRESS, TIMING, default_period,
+                     open_serial)
+from .runlog import DEBUG, INFO, RunLog
+from .scheduler import Scheduler
+from .supply import TIMED_POINTS
+from .timing import NAN, Timing, format_summary
+from .transport import Transport
+
+
+def bus_address(config):
+    # Address selected by the ADR command of a config's setup_comms.
+    for c in config["setup_comms"]:
+        name, _, arg = c.partition(' ')
+        if name.upper() == 'ADR':
+            return int(arg)
+    raise ValueError('No ADR command in the setup of the supply on {}'
+                     .format(config["port"]))
+
+
+class BusChannel:
+    # One addressed supply of a bus and its profile, either the series ts,
+    # vs or an iterable of (t, v) pairs (e.g. profiles.PwlProfile).
+
+    def __init__(self, config, ts=None, vs=None, points=None,
+                 current_mode=False, name=None):
+        self.config = config
+        self.address = bus_address(config)
+        self.name = name if name is not None else 'ADR {}'.format(self.address)
+        self.ts = ts
+        self.vs = vs
+        self.points = points
+        self.current_mode = current_mode
+        self.syntax = drivers.syntax(config, current_mode)
+        self.key = (self.address, 'PC' if current_mode else 'PV')
+        # The ADR is sent by the bus whenever the address changes
+        self.setup_comms = [c for c in config["setup_comms"]
+                            if c.partition(' ')[0].upper() != 'ADR']
+        self.last = None # last command queued for this supply
+        self.timing = None
+
+    def __len__(self):
+        return len(self.ts) if self.points is None else len(self.points)
+
+    def __iter__(self):
+        if self.points is None:
+            return zip(self.ts, self.vs)
+        return iter(self.points)
+
+    def duration(self):
+        if self.points is not None:
+            return self.points.duration()
+        return self.ts[-1] - self.ts[0] if len(self.ts) else 0
+
+
+class Bus:
+    # Plays the profiles of several BusChannels through one Transport.
+    #
+    # The points of all channels are merged by deadline and played by one
+    # Scheduler. Every point whose deadline has passed when the scheduler
+    # wakes up is applied in one batch, ordered so that the supply already
+    # selected goes first and each other address is selected only once; with
+    # the 'skip' late policy only the latest point of each channel in the
+    # batch is kept. A setpoint is not sent if it encodes to the last
+    # command queued for that address, and one still waiting in the
+    # transport queue is replaced in place, after the ADR queued before it.
+
+    def __init__(self, serial, channels, timeout=0.1, late_policy='skip',
+                 output=None):
+        self.serial = serial
+        self.channels = channels
+        self.late_policy = late_policy
+        self.output = output
+        self.transport = Transport(serial, timeout=timeout,
+                                   on_reply=self.reply)
+        self.address = None # selected once the queued commands are written
+        self.switches = 0 # ADR commands sent
+        self.stop = False
+        # Called with (channel index, point index, time) of each point
+        self.progress = None
+        self.scheduler = None
+
+    def close(self):
+        self.transport.close()
+        self.serial.close()
+
+    def write_command(self, c, key=None, tag=None):
+        if self.output is not None:
+            self.output(c)
+        return self.transport.send((c + '\r').encode(), key, tag)
+
+    def reply(self, c, resp, t_sent, latency, tag):
+        if tag is not None:
+            timing, i = tag
+            timing.replied(i, t_sent, latency if resp is not None else NAN)
+        if resp and self.output is not None:
+            self.output(resp)
+
+    def select(self, address):
+        if address != self.address:
+            self.write_command('ADR {}'.format(address))
+            self.address = address
+            self.switches += 1
+
+    def setup(self):
+        for c in self.channels:
+            self.select(c.address)
+            for comm in c.setup_comms:
+                self.write_command(comm)
+        self.transport.flush()
+
+    def setpoint(self, c, i, v, now):
+        # Queue the command for value v of point i of channel c.
+        comm = c.syntax.format(v)
+        if comm == c.last:
+            return
+        c.last = comm
+        data = (comm + '\r').encode()
+        tag = None
+        if c.timing is not None:
+            c.timing.queued(i, now)
+            tag = (c.timing, i)
+        replaced, old = self.transport.replace(data, c.key, tag)
+        if replaced:
+            if self.output is not None:
+                self.output(comm)
+        else:
+            self.select(c.address)
+            old = self.write_command(comm, c.key, tag)
+        if old is not None:
+            old[0].replaced(old[1])
+
+    def apply(self, batch, now):
+        # batch is a list of (t, channel index, point index, value).
+        selected = self.address
+        batch.sort(key=lambda e: (self.channels[e[1]].address != selected,
+                                  self.channels[e[1]].address))
+        for t, k, i, v in batch:
+            c = self.channels[k]
+            if c.timing is not None:
+                c.timing.reached(i, self.scheduler.t0 + t)
+            self.setpoint(c, i, v, now)
+            if self.progress is not None:
+                self.progress(k, i, t)
+
+    def events(self, k):
+        # (t, k, i, v) for the i-th point (t, v) of channel k.
+        for i, (t, v) in enumerate(self.channels[k]):
+            yield t, k, i, v
+
+    def run(self, t0=None):
+        # Play every channel once, from t0 (a time.monotonic() value) or
+        # from now.
+        self.scheduler = Scheduler(t0, late_policy=self.late_policy,
+                                   should_stop=lambda: self.stop)
+        self.scheduler.start()
+        t0 = self.scheduler.t0
+        for c in self.channels:
+            c.timing = None
+            # As in Supply.runpoints, long lazy profiles are not timed
+            if c.points is None or len(c) <= TIMED_POINTS:
+                c.timing = Timing(len(c))
+                c.timing.t0 = t0
+        events = heapq.merge(*(self.events(k)
+                               for k in range(len(self.channels))))
+        event = next(events, None)
+        while event is not None and not self.stop:
+            now = self.scheduler.wait(event[0])
+            if now is None:
+                break
+            batch = [event]
+            event = next(events, None)
+            while event is not None and now >= t0 + event[0]:
+                batch.append(event)
+                event = next(events, None)
+            if self.late_policy == 'skip':
+                latest = {}
+                for e in batch:
+                    latest[e[1]] = e
+                self.scheduler.skipped += len(batch) - len(latest)
+                batch = list(latest.values())
+            self.apply(batch, now)
+
+    def zero(self):
+        # Program 0 V and 0 A on every supply.
+        for c in self.channels:
+            self.select(c.address)
+            driver = drivers.get_driver(c.config)
+            self.write_command(driver.pvsyntax.format(0))
+            self.write_command(driver.pcsyntax.format(0))
+
+
+class BusEngine:
+    # Counterpart of engine.PlaybackEngine for the channels of one bus:
+    # the same events (progress and timing per channel, with the channel's
+    # name), repetitions on one time base and log through a RunLog. The
+    # port settings are those of the first channel's config.
+
+    def __init__(self, channels, repeats=1, period=None, verbose=False,
+                 runlog=None):
+        ports = {c.config["port"] for c in channels}
+        if len(ports) != 1:
+            raise ValueError('The channels of a bus must share one port')
+        addresses = [c.address for c in channels]
+        if len(set(addresses)) != len(addresses):
+            raise ValueError('Two supplies on the bus have the same address')
+        self.channels = channels
+        self.repeats = repeats
+        self.period = period
+        self.verbose = verbose
+        self.events = queue.Queue()
+        self.runlog = runlog if runlog is not None else RunLog()
+        self.bus = None
+        self.thread = None
+        self.stopped = False
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopped = True
+        if self.bus is not None:
+            self.bus.stop = True
+
+    def join(self, timeout=None):
+        self.thread.join(timeout)
+
+    def running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def log(self, text, level=DEBUG):
+        self.runlog.write(text, level)
+
+    def run(self):
+        try:
+            self.execute()
+        except Exception as e:
+            self.events.put((ERROR, e))
+        else:
+            self.events.put((DONE, not self.stopped))
+
+    def execute(self):
+        config = self.channels[0].config
+        timeout = max(float(c.config.get("timeout", c.config["sleeptime"]))
+                      for c in self.channels)
+        self.bus = Bus(open_serial(config), self.channels,
+                       timeout=timeout/1000, output=self.log)
+        if self.stopped:
+            self.bus.stop = True
+        try:
+            self.play()
+        finally:
+            self.bus.close()
+        self.log("{} address switches".format(self.bus.switches), INFO)
+
+    def report_timing(self, r, timings):
+        for c, timing in zip(self.channels, timings):
+            if timing is None:
+                continue
+            summary = timing.summary()
+            self.events.put((TIMING, (r, summary)))
+            self.log("[{}] {}".format(c.name, format_summary(summary)), INFO)
+
+    def play(self):
+        bus = self.bus
+        sleep_time = max(float(c.config["sleeptime"])
+                         for c in self.channels)/1000
+        period = self.period
+        if period is None:
+            period = max(default_period(c.duration(), sleep_time, c.points)
+                         for c in self.channels)
+        period = max(period, sleep_time)
+        for c in self.channels:
+            if c.points is not None and len(c) > TIMED_POINTS:
+                self.log("[{}] The profile has too many points to record the "
+                         "timing of each one".format(c.name), INFO)
+        bus.setup()
+        t0 = time.monotonic()
+        previous = None
+        r = 0
+        while (not self.repeats or r < self.repeats) and not self.stopped:
+            bus.progress = lambda k, i, t, r=r: self.events.put(
+                (PROGRESS, (r, i, len(self.channels[k]),
+                            self.channels[k].name, t)))
+            bus.run(t0 + r*period)
+            drift = bus.scheduler.first_late
+            if drift is not None:
+                self.events.put((CYCLE, (r, drift)))
+                self.log("Cycle {}: started {:.3f} ms late".format(
+                    r + 1, drift*1000), INFO)
+            if previous is not None:
+                self.report_timing(*previous)
+            previous = (r, [c.timing for c in self.channels])
+            r += 1
+        bus.progress = None
+        bus.transport.flush()
+        if previous is not None:
+            self.report_timing(*previous)
+        bus.zero()
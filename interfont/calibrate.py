@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Measures how fast a supply reliably takes commands and stores the result
+# in its configuration, instead of a hand-tuned sleep time:
+#
+#   python3 -m interfont.calibrate configs/lambdaGEN16-150.json
+#
+# Only queries are sent (IDN? by default, or the config's "probe"), after
+# the ADR commands of the setup, so the supply's output is not touched.
+
+import argparse
+import json
+import math
+import sys
+import time
+
+from . import engine
+from .timing import percentile
+from .transport import Transport
+
+# Number of probes in each measurement
+PROBES = 50
+# Longest wait for a reply while measuring, in seconds
+PROBE_TIMEOUT = 1.0
+# The command interval is the 99th percentile reply time times this
+MARGIN = 1.5
+# Factor to slow down by when probes at the measured rate go unanswered
+BACKOFF = 1.5
+ATTEMPTS = 5
+
+
+class CalibrationError(Exception):
+    pass
+
+
+def probe(ser, command, count, timeout):
+    # Send command count times, each after the previous reply. Returns the
+    # reply latencies and the number of probes that timed out.
+    latencies = []
+    timeouts = [0]
+
+    def on_reply(c, reply, t_sent, latency, tag):
+        if reply is None:
+            timeouts[0] += 1
+        else:
+            latencies.append(latency)
+
+    t = Transport(ser, timeout=timeout, on_reply=on_reply)
+    try:
+        for _ in range(count):
+            t.send((command + '\r').encode())
+        t.flush()
+    finally:
+        t.close(drain=False)
+    return latencies, timeouts[0]
+
+
+def calibrate(ser, config, probes=PROBES):
+    # Return a dict with the command interval and reply timeout (seconds)
+    # the supply on ser can sustain, and the reply times measured.
+    command = config.get("probe", "IDN?")
+    address = [c for c in config["setup_comms"] if c.upper().startswith('ADR')]
+    for c in address:
+        ser.write((c + '\r').encode())
+        time.sleep(PROBE_TIMEOUT/10)
+    ser.reset_input_buffer()
+
+    latencies, timeouts = probe(ser, command, probes, PROBE_TIMEOUT)
+    if timeouts or not latencies:
+        raise CalibrationError('{} of {} probes ({}) were not answered'
+                               .format(timeouts, probes, command))
+    latencies.sort()
+    p50 = percentile(latencies, 50)
+    p99 = percentile(latencies, 99)
+    interval = p99*MARGIN
+    # Check that the supply keeps up when paced at that interval
+    for attempt in range(ATTEMPTS):
+        _, timeouts = probe(ser, command, probes, interval)
+        if timeouts == 0:
+            break
+        interval *= BACKOFF
+    else:
+        raise CalibrationError('the supply does not answer reliably')
+    return {"interval": interval,
+            "timeout": interval,
+            "latency_p50": p50,
+            "latency_p99": p99,
+            "probe": command,
+            "probes": probes}
+
+
+def apply_calibration(config, result):
+    # Store a calibration in a config: the sleep time (also the ramp
+    # resolution) and the reply timeout, in whole ms like the GUI fields.
+    config["sleeptime"] = str(max(1, math.ceil(result["interval"]*1000)))
+    config["timeout"] = str(max(1, math.ceil(result["timeout"]*1000)))
+    config["calibration"] = dict(result,
+                                 date=time.strftime('%Y-%m-%dT%H:%M:%S'))
+    return config
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Measure the command rate of a supply and store it in "
+                    "its configuration.")
+    parser.add_argument("config", help="supply configuration (JSON)")
+    parser.add_argument("--port", help="override the port in the config")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="only print the result")
+    args = parser.parse_args(argv)
+
+    config = engine.load_config(args.config)
+    if args.port:
+        config["port"] = args.port
+    ser = engine.open_serial(config)
+    try:
+        result = calibrate(ser, config)
+    except CalibrationError as e:
+        print("Calibration failed: {}".format(e))
+        return 1
+    finally:
+        ser.close()
+    print("Reply time p50 {:.2f} ms, p99 {:.2f} ms; command interval {:.2f} ms"
+          .format(result["latency_p50"]*1000, result["latency_p99"]*1000,
+                  result["interval"]*1000))
+    if not args.dry_run:
+        if args.port:
+            config = engine.load_config(args.config)
+        with open(args.config, 'w') as f:
+            json.dump(apply_calibration(config, result), f)
+        print("Saved to {}".format(args.config))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
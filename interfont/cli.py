@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Command line front end: runs a CSV profile on a supply without a display.
+#
+#   python3 -m interfont.cli configs/lambdaZ60-14.json pwl.csv --pwl --repeat 3
+#
+# With --also, several supplies play their profiles in sync:
+#
+#   python3 -m interfont.cli configs/lambdaGEN16-150.json pwl.csv \
+#       --also configs/lambdaZ60-14.json current_profile.csv
+#
+# If all their configs have the same port, the supplies are taken to be on
+# one RS-485 bus and played by a single scheduler (see bus.py).
+#
+# The profile can also be a waveform defined by a formula (see waveforms.py):
+#
+#   python3 -m interfont.cli configs/lambdaZ60-14.json ripple.json
+#
+# With --journal the run can be resumed after a crash or a stop, by running
+# the same command again with --resume:
+#
+#   python3 -m interfont.cli configs/lambdaZ60-14.json pwl.csv --pwl \
+#       --journal run.ifjn --resume
+#
+# With --process the playback runs in a process of its own (see isolate.py),
+# optionally pinned to one CPU with --cpu.
+
+import argparse
+import os
+import queue
+import sys
+
+from . import engine, telemetry
+from .bus import BusChannel, BusEngine
+from .isolate import ProcessEngine
+from .multi import MultiEngine, SKEW, format_skew
+from .profiles import load_profile
+from .runlog import DEBUG, INFO, LEVELS, RunLog
+from .simplify import SHAPES, simplify
+from .waveforms import is_waveform, load_waveform
+
+# Seconds between prints of the log
+REFRESH = 0.1
+
+
+def config_paths(args):
+    return [(args.config, args.profile)] + [tuple(a) for a in args.also or []]
+
+
+def shared_port(args):
+    # Whether the supplies of --also are all on one port, and so play as a
+    # bus (see bus.py).
+    if not args.also:
+        return False
+    return len({engine.load_config(c)["port"]
+                for c, _ in config_paths(args)}) == 1
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Program a power supply with a CSV profile.")
+    parser.add_argument("config", help="supply configuration (JSON)")
+    parser.add_argument("profile", help="CSV file with time, value rows, or "
+                                        "a waveform definition (JSON, see "
+                                        "waveforms.py)")
+    parser.add_argument("--pwl", action="store_true",
+                        help="treat the profile as ramps instead of steps")
+    parser.add_argument("--lazy", action="store_true",
+                        help="generate ramp points during playback instead "
+                             "of expanding them beforehand")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="do not use or create a compiled profile")
+    parser.add_argument("--tolerance", type=float,
+                        help="simplify the profile to the fewest points "
+                             "within this many volts (or amps) of it, no "
+                             "closer than the sleep time")
+    parser.add_argument("--shape", choices=SHAPES, default='steps',
+                        help="shape of the simplified profile (default "
+                             "steps)")
+    parser.add_argument("--current", action="store_true",
+                        help="program current instead of voltage")
+    parser.add_argument("--repeat", type=int, default=1,
+                        help="number of repetitions (default 1), 0 to "
+                             "repeat until interrupted")
+    parser.add_argument("--period", type=float,
+                        help="seconds between the starts of repetitions "
+                             "(default: the duration of the profile, its "
+                             "last point lasting one sleep time)")
+    parser.add_argument("--port", help="override the port in the config")
+    parser.add_argument("--also", nargs=2, action="append",
+                        metavar=("CONFIG", "PROFILE"),
+                        help="play another profile on another supply at the "
+                             "same time (can be repeated)")
+    parser.add_argument("--timing", metavar="FILE",
+                        help="save the timing of every point to FILE "
+                             "(JSON if it ends in .json, CSV otherwise)")
+    parser.add_argument("--telemetry", metavar="FILE",
+                        help="measure the output during the run and save "
+                             "it to FILE (see telemetry.py)")
+    parser.add_argument("--telemetry-rate", type=float,
+                        default=telemetry.RATE,
+                        help="measurements per second (default {})"
+                             .format(telemetry.RATE))
+    parser.add_argument("--journal", metavar="FILE",
+                        help="record every point applied in FILE, to be "
+                             "able to resume the run (see journal.py)")
+    parser.add_argument("--resume", action="store_true",
+                        help="carry on the run recorded in the --journal "
+                             "file after its last point")
+    parser.add_argument("--stream", action="store_true",
+                        help="send the setpoints one at a time even if the "
+                             "supply could play the profile from its list "
+                             "memory (see drivers.py)")
+    parser.add_argument("--process", action="store_true",
+                        help="play in a separate process, away from the "
+                             "rest of the program (see isolate.py)")
+    parser.add_argument("--cpu", type=int,
+                        help="with --process, run the playback on this CPU "
+                             "only")
+    parser.add_argument("--quiet", action="store_true",
+                        help="do not log the commands sent (same as "
+                             "--log-level info)")
+    parser.add_argument("--log-level", choices=sorted(LEVELS),
+                        help="least important messages logged "
+                             "(default debug)")
+    parser.add_argument("--log-file", metavar="FILE",
+                        help="also append the log to FILE")
+    args = parser.parse_args(argv)
+    if args.process and args.also:
+        parser.error("--process plays a single supply, it cannot be used "
+                     "with --also")
+    if args.journal and args.also:
+        parser.error("--journal records a single supply, it cannot be used "
+                     "with --also")
+    if args.telemetry and shared_port(args):
+        parser.error("--telemetry cannot be used with --also when all the "
+                     "supplies share one port")
+    if args.resume and not args.journal:
+        parser.error("--resume needs the --journal to resume from")
+    return args
+
+
+def read_profile(path, min_trans, args, runlog):
+    # Load a profile without the cache, simplifying it if asked to. Lazy
+    # ramps are already just their breakpoints and waveforms just their
+    # formula, and are left as they are.
+    if is_waveform(path):
+        return load_waveform(path, min_trans)
+    profile = load_profile(path, args.pwl, min_trans, args.lazy)
+    if isinstance(profile, tuple) and args.tolerance is not None:
+        ts, vs, deviation = simplify(*profile, args.tolerance, min_trans,
+                                     args.shape)
+        runlog.info("Simplified {}: {} of {} points, largest deviation {:.6g}"
+                    .format(path, len(ts), len(profile[0]), deviation))
+        profile = ts, vs
+    return profile
+
+
+def make_engine(config_path, profile_path, args, runlog,
+                override_port=True, telemetry_path=None):
+    config = engine.load_config(config_path)
+    if args.port and override_port:
+        config["port"] = args.port
+    min_trans = float(config["sleeptime"])/1000
+    ts = vs = points = source = None
+    if args.lazy or args.no_cache or is_waveform(profile_path):
+        profile = read_profile(profile_path, min_trans, args, runlog)
+        if isinstance(profile, tuple):
+            ts, vs = profile
+        else:
+            points = profile
+    else:
+        source = (profile_path, args.pwl)
+    kwargs = {}
+    cls = engine.PlaybackEngine
+    if args.process:
+        cls = ProcessEngine
+        kwargs["cpu"] = args.cpu
+    return cls(config, ts, vs,
+               current_mode=args.current,
+               repeats=args.repeat,
+               period=args.period,
+               points=points,
+               source=source,
+               timing_path=args.timing,
+               telemetry_path=telemetry_path,
+               telemetry_rate=args.telemetry_rate,
+               tolerance=args.tolerance,
+               shape=args.shape,
+               journal_path=args.journal,
+               resume=args.resume,
+               use_list=not args.stream,
+               runlog=runlog,
+               **kwargs)
+
+
+def make_bus(paths, args, runlog):
+    # Engine for supplies sharing one port, --port applies to all of them.
+    channels = []
+    for config_path, profile_path in paths:
+        config = engine.load_config(config_path)
+        if args.port:
+            config["port"] = args.port
+        min_trans = float(config["sleeptime"])/1000
+        profile = read_profile(profile_path, min_trans, args, runlog)
+        if isinstance(profile, tuple):
+            c = BusChannel(config, *profile, current_mode=args.current)
+        else:
+            c = BusChannel(config, points=profile, current_mode=args.current)
+        channels.append(c)
+    return BusEngine(channels, repeats=args.repeat, period=args.period,
+                     runlog=runlog)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    level = DEBUG
+    if args.quiet:
+        level = INFO
+    if args.log_level:
+        level = LEVELS[args.log_level]
+    runlog = RunLog(level=level, path=args.log_file)
+    paths = config_paths(args)
+    if shared_port(args):
+        e = make_bus(paths, args, runlog)
+    elif args.also:
+        # Several supplies, --port only applies to the first one. Each
+        # one saves its telemetry to its own file, numbered from the second.
+        channels = [make_engine(args.config, args.profile, args, runlog,
+                                telemetry_path=args.telemetry)]
+        for k, (c, p) in enumerate(args.also, 2):
+            path = None
+            if args.telemetry:
+                root, ext = os.path.splitext(args.telemetry)
+                path = '{}-{}{}'.format(root, k, ext)
+            channels.append(make_engine(c, p, args, runlog, False, path))
+        e = MultiEngine(channels, runlog)
+    else:
+        e = make_engine(args.config, args.profile, args, runlog,
+                        telemetry_path=args.telemetry)
+    e.start()
+    result = 1
+    try:
+        while True:
+            try:
+                kind, payload = e.events.get(timeout=REFRESH)
+            except queue.Empty:
+                kind = None
+            for line in runlog.drain():
+                print(line)
+            if kind == SKEW:
+                print(format_skew(payload))
+            elif kind == engine.DONE:
+                print("Execution completed" if payload else "Execution stopped")
+                result = 0
+                break
+            elif kind == engine.ERROR:
+                print("Error: {}".format(payload), file=sys.stderr)
+                break
+    except KeyboardInterrupt:
+        e.stop()
+        e.join()
+    finally:
+        runlog.close()
+    return result
+
+
+if __name__ == "__main__":
+    sys.exit(main())
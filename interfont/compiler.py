@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Compiles a CSV profile for a given supply configuration into a binary
+# file with the times, the values and the commands already encoded, so that
+# playback does no parsing or string formatting. Consecutive points that
+# encode to the same command are merged into one. Compiled profiles are
+# cached on disk, keyed by a hash of the CSV contents and of the config
+# fields that affect the result, and memory-mapped when used.
+#
+# File layout (little endian):
+#   header   MAGIC, version, number of points n, length of the command blob,
+#            number of points in the source profile, largest deviation
+#            from it (NaN unless simplified)
+#   times    n doubles
+#   values   n doubles
+#   offsets  n+1 unsigned 64 bit ints, command i is blob[offsets[i]:offsets[i+1]]
+#   blob     the encoded commands, each ending with the EOL
+
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+import tempfile
+from array import array
+
+from . import drivers
+from .profiles import compress_series, load_profile
+from .simplify import simplify
+
+MAGIC = b'IFPC'
+VERSION = 4
+HEADER = struct.Struct('<4sIQQQd')
+
+NAN = float('nan')
+
+CACHE_DIR = os.environ.get('INTERFONT_CACHE',
+                           os.path.join(os.path.expanduser('~'), '.cache',
+                                        'interfont'))
+
+
+class CompiledProfile:
+
+    def __init__(self, times, values, offsets, blob, source=None,
+                 original=None, deviation=NAN):
+        self.times = times
+        self.values = values
+        self.offsets = offsets
+        self.blob = blob
+        self.source = source # the mmap the arrays point into, if any
+        # Number of points before merging repeated commands
+        self.original = len(times) if original is None else original
+        # Largest difference from the source profile, if simplified
+        self.deviation = deviation
+
+    def __len__(self):
+        return len(self.times)
+
+    def saved(self):
+        # Commands saved by merging points that encode the same.
+        return self.original - len(self)
+
+    def command(self, i):
+        return bytes(self.blob[self.offsets[i]:self.offsets[i+1]])
+
+    def close(self):
+        if self.source is not None:
+            for a in (self.times, self.values, self.offsets, self.blob):
+                a.release()
+            self.times = self.values = self.offsets = self.blob = None
+            self.source.close()
+            self.source = None
+
+
+def compile_series(ts, vs, syntax, simplified=None):
+    # Encode each value of vs with syntax (e.g. config["pvsyntax"]), merging
+    # the points that would repeat the previous command. simplified is
+    # (tolerance, min_interval, shape) to simplify the series first (see
+    # simplify.py).
+    original = len(ts)
+    deviation = NAN
+    if simplified is not None:
+        ts, vs, deviation = simplify(ts, vs, *simplified)
+    times, values, saved = compress_series(ts, vs, syntax)
+    offsets = array('Q', [0])
+    commands = []
+    n = 0
+    for v in values:
+        c = (syntax.format(v) + '\r').encode()
+        commands.append(c)
+        n += len(c)
+        offsets.append(n)
+    return CompiledProfile(times, values, offsets, b''.join(commands),
+                           original=original, deviation=deviation)
+
+
+def parts(profile):
+    # The contents of the file of a compiled profile, piece by piece.
+    yield HEADER.pack(MAGIC, VERSION, len(profile), len(profile.blob),
+                      profile.original, profile.deviation)
+    for a in (profile.times, profile.values, profile.offsets):
+        if sys.byteorder != 'little':
+            a = array(a.typecode, a)
+            a.byteswap()
+        yield a.tobytes()
+    yield profile.blob
+
+
+def nbytes(profile):
+    return HEADER.size + 24*len(profile) + 8 + len(profile.blob)
+
+
+def save(profile, path):
+    # Write atomically, so a cache file is either complete or absent, to a
+    # temporary file of its own in case another process saves it too.
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or '.',
+                               suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            for part in parts(profile):
+                f.write(part)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def write_into(profile, buffer):
+    # Copy a compiled profile into a writable buffer of at least
+    # nbytes(profile), e.g. shared memory, in the layout of the file.
+    pos = 0
+    for part in parts(profile):
+        buffer[pos:pos + len(part)] = part
+        pos += len(part)
+
+
+def from_buffer(buffer, source=None, name='buffer'):
+    # A compiled profile whose arrays are views on buffer (as written by
+    # save or write_into). source is closed along with the profile.
+    if len(buffer) < HEADER.size:
+        raise ValueError('{} is not a compiled profile'.format(name))
+    magic, version, n, size, original, deviation = HEADER.unpack_from(buffer)
+    if magic != MAGIC or version != VERSION \
+       or len(buffer) < HEADER.size + 24*n + 8 + size:
+        raise ValueError('{} is not a compiled profile'.format(name))
+    view = memoryview(buffer)
+    start = HEADER.size
+    times = view[start:start + 8*n].cast('d')
+    start += 8*n
+    values = view[start:start + 8*n].cast('d')
+    start += 8*n
+    offsets = view[start:start + 8*(n+1)].cast('Q')
+    start += 8*(n+1)
+    blob = view[start:start + size]
+    view.release()
+    return CompiledProfile(times, values, offsets, blob, source=source,
+                           original=original, deviation=deviation)
+
+
+def load(path):
+    # Memory-map a compiled profile. The arrays are views on the file.
+    with open(path, 'rb') as f:
+        m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        profile = from_buffer(m, m, path)
+    except ValueError:
+        m.close()
+        raise
+    if len(m) != nbytes(profile):
+        profile.close()
+        raise ValueError('{} is not a compiled profile'.format(path))
+    return profile
+
+
+def cache_key(path, config, pwl=False, current_mode=False, tolerance=None,
+              shape='steps'):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    fields = {"version": VERSION,
+              "pwl": pwl,
+              "syntax": drivers.syntax(config, current_mode)}
+    if pwl or tolerance is not None:
+        fields["sleeptime"] = float(config["sleeptime"])
+    if tolerance is not None:
+        fields["tolerance"] = tolerance
+        fields["shape"] = shape
+    h.update(json.dumps(fields, sort_keys=True).encode())
+    return h.hexdigest()
+
+
+def cached_profile(path, config, pwl=False, current_mode=False,
+                   cache_dir=None, tolerance=None, shape='steps'):
+    # Return the compiled profile for a CSV file, compiling and caching it
+    # first if needed. With a tolerance the profile is simplified to it,
+    # with the sleep time as the shortest step.
+    cache_dir = cache_dir or CACHE_DIR
+    key = cache_key(path, config, pwl, current_mode, tolerance, shape)
+    cached = os.path.join(cache_dir, key + '.ifpc')
+    if os.path.exists(cached):
+        try:
+            return load(cached)
+        except (ValueError, struct.error):
+            # Truncated or corrupt (a full disk, a copy cut short):
+            # compile it again
+            pass
+    syntax = drivers.syntax(config, current_mode)
+    min_interval = float(config["sleeptime"])/1000
+    ts, vs = load_profile(path, pwl, min_interval)
+    simplified = None
+    if tolerance is not None:
+        simplified = (tolerance, min_interval, shape)
+    os.makedirs(cache_dir, exist_ok=True)
+    save(compile_series(ts, vs, syntax, simplified), cached)
+    return load(cached)
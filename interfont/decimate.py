@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import numpy as np
+
+
+def minmax_decimate(ts, vs, t0, t1, buckets):
+    # Reduce the step series ts, vs to what can be seen between t0 and t1
+    # on a plot `buckets` pixels wide. The visible samples are split into
+    # buckets of equal time, and each bucket is drawn as its first value, its
+    # minimum and maximum, and its last value, so peaks are never lost.
+    # Returns the (possibly unreduced) arrays to plot.
+    ts = np.asarray(ts, dtype=np.float64)
+    vs = np.asarray(vs, dtype=np.float64)
+    # Keep the sample in force at t0 and the first one after t1, so the
+    # steps reach both edges of the plot.
+    i0 = max(0, np.searchsorted(ts, t0, 'right') - 1)
+    i1 = min(len(ts), np.searchsorted(ts, t1, 'right') + 1)
+    ts = ts[i0:i1]
+    vs = vs[i0:i1]
+    if len(ts) <= 4*buckets:
+        return ts, vs
+    edges = np.linspace(ts[0], ts[-1], buckets + 1)[:-1]
+    starts = np.unique(np.searchsorted(ts, edges))
+    ends = np.append(starts[1:], len(ts)) - 1
+    vmin = np.minimum.reduceat(vs, starts)
+    vmax = np.maximum.reduceat(vs, starts)
+    t_start = ts[starts]
+    out_t = np.column_stack((t_start, t_start, t_start, ts[ends])).ravel()
+    out_v = np.column_stack((vs[starts], vmin, vmax, vs[ends])).ravel()
+    return out_t, out_v
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Supply drivers: the commands each model of supply takes and what it can
+# do. A config names its driver in "driver" (see configs/); configs without
+# one get the generic driver, which only knows the "pvsyntax" and
+# "pcsyntax" format strings of the config. Those fields still override a
+# driver's own syntax when present.
+#
+# Capabilities:
+#   STREAM  setpoints are sent one at a time as playback reaches them
+#   LIST    a whole compiled profile can be uploaded into the supply's list
+#           memory and run by the supply itself, timed by its own clock
+#
+# The engine uploads a profile when the driver can run it from list memory
+# (see Driver.fits) and streams it otherwise. Drivers with the LIST
+# capability define upload(), trigger() and abort(), the commands that load,
+# start and stop a list (see ZPlusDriver). Each driver has a simulated
+# stand-in of its model, with the same capabilities:
+#
+#   sim = get_driver(config).simulated(latency=0.002).start()
+#   config["port"] = sim.port
+
+STREAM = 'stream'
+LIST = 'list'
+
+
+class Driver:
+    # The generic driver, and the base of the others. Subclasses set the
+    # class attributes.
+    name = 'generic'
+    # Model the simulated stand-in identifies as
+    model = 'GEN16-150'
+    capabilities = frozenset({STREAM})
+    pvsyntax = 'PV {:06.3f}'
+    pcsyntax = 'PC {:06.2f}'
+    # Most points of list memory, and shortest time a point of a list can
+    # last in seconds
+    list_points = 0
+    min_dwell = 0
+
+    def __init__(self, config):
+        self.pvsyntax = config.get("pvsyntax") or type(self).pvsyntax
+        self.pcsyntax = config.get("pcsyntax") or type(self).pcsyntax
+        self.list_points = int(config.get("list_points", self.list_points))
+
+    def can(self, capability):
+        return capability in self.capabilities
+
+    def syntax(self, current_mode=False):
+        return self.pcsyntax if current_mode else self.pvsyntax
+
+    def setpoint(self, value, current_mode=False):
+        # The command that sets the output voltage (or current) to value.
+        return self.syntax(current_mode).format(value)
+
+    def dwells(self, profile, period):
+        # Time each point of a compiled profile lasts, the last one until
+        # the next repetition.
+        ts = profile.times
+        return [ts[i+1] - ts[i] for i in range(len(ts) - 1)] \
+            + [period - ts[-1]]
+
+    def fits(self, profile, period, repeats):
+        # Whether the supply can play a compiled profile, repeats times
+        # every period seconds, from its list memory.
+        if not self.can(LIST) or not 0 < len(profile) <= self.list_points \
+           or repeats < 1 or profile.times[0] != 0:
+            return False
+        return min(self.dwells(profile, period)) >= self.min_dwell
+
+    def simulated(self, **kwargs):
+        from .simulator import SimulatedSupply
+        return SimulatedSupply(model=self.model, lists=self.can(LIST),
+                               **kwargs)
+
+
+class GenesysDriver(Driver):
+    # Lambda Genesys (GEN) supplies, which only take one setpoint at a time.
+    name = 'lambda-genesys'
+    model = 'GEN16-150'
+
+
+class ZPlusDriver(Driver):
+    # Lambda Z+ supplies. Besides the GEN commands they have a list of up to
+    # 12 points, loaded and run with the SCPI LIST and TRIG subsystems.
+    name = 'lambda-zplus'
+    model = 'Z60-14'
+    capabilities = frozenset({STREAM, LIST})
+    pvsyntax = 'PV {:07.4f}'
+    pcsyntax = 'PC {:07.4f}'
+    list_points = 12
+    min_dwell = 0.01
+    # Values and dwells of a list, at the resolution of the supply
+    list_value = '{:.4f}'
+
+    def upload(self, profile, period, repeats, current_mode=False):
+        # Commands that load a profile into list memory and arm it.
+        mode = 'CURR' if current_mode else 'VOLT'
+        return ['{}:MODE FIX'.format(mode),
+                'LIST:{} {}'.format(mode, ','.join(
+                    self.list_value.format(v) for v in profile.values)),
+                'LIST:DWEL {}'.format(','.join(
+                    self.list_value.format(d)
+                    for d in self.dwells(profile, period))),
+                'LIST:COUN {}'.format(repeats),
+                'LIST:STEP AUTO',
+                'TRIG:SOUR BUS',
+                '{}:MODE LIST'.format(mode),
+                'INIT']
+
+    def trigger(self):
+        # Commands that start an uploaded list.
+        return ['*TRG']
+
+    def abort(self, current_mode=False):
+        # Commands that stop a list and go back to fixed setpoints.
+        return ['ABOR', '{}:MODE FIX'.format('CURR' if current_mode
+                                              else 'VOLT')]
+
+
+DRIVERS = {d.name: d for d in (Driver, GenesysDriver, ZPlusDriver)}
+
+
+def get_driver(config):
+    name = config.get("driver", Driver.name)
+    if name not in DRIVERS:
+        raise ValueError('Unknown driver {!r}, expected one of {}'.format(
+            name, ', '.join(sorted(DRIVERS))))
+    return DRIVERS[name](config)
+
+
+def syntax(config, current_mode=False):
+    # Format string of the setpoint commands of a config.
+    return get_driver(config).syntax(current_mode)
@@ -0,0 +1,419 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import queue
+import threading
+import time
+
+from . import compiler, drivers, journal, telemetry
+from .runlog import DEBUG, INFO, WARNING, RunLog
+from .scheduler import wait_until
+from .supply import TIMED_POINTS, Supply
+from .timing import format_summary
+from .waveforms import Waveform
+
+# Kinds of events put on PlaybackEngine.events, as (kind, payload) tuples:
+#   'progress' payload is (repetition, index, length, name, time), time
+#              being that of the point in the profile
+#   'cycle'    payload is (repetition, drift), drift being how late in
+#              seconds the first point of the repetition was applied
+#   'timing'   payload is (repetition, summary) with the timing.Timing
+#              summary of each repetition
+#   'measured' payload is a telemetry sample (time, setpoint, voltage,
+#              current), when the run takes telemetry
+#   'done'     payload is True if the run finished, False if it was stopped
+#   'error'    payload is the exception that ended the run
+# Log lines (commands, replies, messages) don't go through the queue but
+# into the engine's runlog.RunLog, which the caller drains at its own rate.
+PROGRESS = 'progress'
+TIMING = 'timing'
+MEASURED = 'measured'
+CYCLE = 'cycle'
+DONE = 'done'
+ERROR = 'error'
+
+
+def load_config(path):
+    # Read a supply configuration as saved by the GUI (see configs/).
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def open_serial(config):
+    # pyserial is only imported once a port is opened, so loading and
+    # compiling profiles work without it.
+    import serial
+    return serial.Serial(port = config["port"],
+                         baudrate=int(config["baudrate"]),
+                         write_timeout=0,
+                         bytesize=serial.EIGHTBITS,
+                         stopbits=serial.STOPBITS_ONE,
+                         parity=serial.PARITY_NONE)
+
+
+def make_supply(config, ser, output, verbose=False):
+    # Commands are paced by the supply's replies, waiting at most "timeout"
+    # ms (or the sleep time if the config has no timeout) for each one.
+    timeout = config.get("timeout", config["sleeptime"])
+    driver = drivers.get_driver(config)
+    return Supply(serial=ser,
+                  sleep_time=float(config["sleeptime"])/1000,
+                  pvsyntax=driver.pvsyntax,
+                  pcsyntax=driver.pcsyntax,
+                  output=output,
+                  verbose=verbose,
+                  setup_comms=config["setup_comms"],
+                  ack_timeout=float(timeout)/1000)
+
+
+def default_period(duration, interval, points=None):
+    # Period of the repetitions of a profile when none is given: from its
+    # first point until its last one has lasted a command interval, like
+    # the others. A waveform's duration already ends a step after its last
+    # point.
+    if isinstance(points, Waveform):
+        return duration
+    return duration + interval
+
+
+class PlaybackEngine:
+    # Runs a profile on a supply from a worker thread. Everything the run
+    # wants to report goes through the events queue, so the caller (the GUI
+    # or the command line) decides when and how to display it.
+    #
+    # The profile is either the series ts, vs or, with ts and vs left as
+    # None, an iterable of (t, v) pairs consumed lazily during playback
+    # (e.g. profiles.PwlProfile). If the CSV file the profile came from is
+    # given as source=(path, pwl), the run uses its compiled and cached
+    # version instead (see compiler.py), simplified to within tolerance if
+    # one is given (see simplify.py).
+    #
+    # When several engines play together (see multi.py) each one has a name,
+    # which is prepended to its log lines, and a sync function that blocks
+    # until all of them are ready and returns their common start time.
+    #
+    # Repetitions follow each other without gaps, every `period` seconds
+    # (by default, see default_period), and repeats=0 plays the profile
+    # until stopped.
+    #
+    # With a telemetry_path, the supply's output is measured
+    # telemetry_rate times a second during the run and saved there (see
+    # telemetry.py).
+    #
+    # With sessions (a session.SessionManager) the port is left open after
+    # the run, for the next one, and closed only if the run failed.
+    #
+    # With a journal_path, every point applied is recorded there (see
+    # journal.py). With resume as well, a run recorded in that journal
+    # carries on after its last point: the setpoint of that point is
+    # restored with the setup commands, and the time base is shifted so
+    # that the following points keep their spacing. Its telemetry, if any,
+    # goes on in the same file.
+    #
+    # If the supply's driver can (see drivers.py) and use_list is set, a
+    # compiled profile is uploaded into the supply's list memory and played
+    # by the supply itself, the engine only following it on the clock.
+
+    def __init__(self, config, ts=None, vs=None, current_mode=False,
+                 repeats=1, verbose=False, points=None, source=None,
+                 name=None, sync=None, timing_path=None, runlog=None,
+                 period=None, telemetry_path=None,
+                 telemetry_rate=telemetry.RATE, tolerance=None,
+                 shape='steps', sessions=None, compiled=None,
+                 journal_path=None, resume=False, use_list=True):
+        self.config = config
+        self.ts = ts
+        self.vs = vs
+        self.points = points
+        self.source = source
+        self.tolerance = tolerance
+        self.shape = shape
+        # An already compiled profile to play, instead of ts, vs
+        self.compiled = compiled
+        self.current_mode = current_mode
+        self.repeats = repeats
+        self.period = period
+        self.verbose = verbose
+        self.name = name
+        self.sync = sync
+        # Where to export the timing of each repetition, if anywhere
+        self.timing_path = timing_path
+        self.telemetry_path = telemetry_path
+        self.telemetry_rate = telemetry_rate
+        self.journal_path = journal_path
+        self.resume = resume
+        self.journal = None
+        self.driver = drivers.get_driver(config)
+        self.use_list = use_list
+        self.events = queue.Queue()
+        self.runlog = runlog if runlog is not None else RunLog()
+        self.sessions = sessions
+        self.supply = None
+        self.thread = None
+        self.stopped = False
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopped = True
+        if self.supply is not None:
+            self.supply.stop = True
+
+    def join(self, timeout=None):
+        self.thread.join(timeout)
+
+    def running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def log(self, text, level=DEBUG):
+        if self.name is not None:
+            text = '[{}] {}'.format(self.name, text)
+        self.runlog.write(text, level)
+
+    def run(self):
+        try:
+            self.execute()
+        except Exception as e:
+            self.events.put((ERROR, e))
+        else:
+            self.events.put((DONE, not self.stopped))
+
+    def compile(self):
+        if self.source is not None:
+            path, pwl = self.source
+            self.compiled = compiler.cached_profile(
+                path, self.config, pwl, self.current_mode,
+                tolerance=self.tolerance, shape=self.shape)
+            if self.tolerance is None:
+                self.log("Compiled profile: {} points, {} repeated commands "
+                         "merged".format(len(self.compiled),
+                                         self.compiled.saved()), INFO)
+            else:
+                self.log("Compiled profile: {} of {} points, largest "
+                         "deviation {:.6g}".format(len(self.compiled),
+                                                   self.compiled.original,
+                                                   self.compiled.deviation),
+                         INFO)
+
+    def execute(self):
+        # The whole run, from compiling the profile to closing (or
+        # releasing) the port.
+        self.compile()
+        if self.sessions is not None:
+            session = self.sessions.get(self.config)
+            self.supply = session.get_supply(self.config, self.log,
+                                             self.verbose)
+        else:
+            ser = open_serial(self.config)
+            self.supply = make_supply(self.config, ser, self.log,
+                                      self.verbose)
+        if self.stopped:
+            self.supply.stop = True
+        if self.telemetry_path is not None:
+            self.supply.telemetry = telemetry.Telemetry(
+                self.telemetry_path, self.telemetry_rate,
+                self.config.get("telemetry_queries", telemetry.QUERIES))
+            self.supply.telemetry.listener = lambda row: self.events.put(
+                (MEASURED, tuple(row)))
+            self.supply.telemetry.on_missed = lambda: self.log(
+                "Telemetry cannot keep up with {:g} samples/s between "
+                "setpoints, some samples will be missing".format(
+                    self.telemetry_rate), WARNING)
+        t = self.supply.telemetry
+        try:
+            self.play()
+            if self.sessions is not None:
+                self.supply.release()
+        except Exception:
+            if self.sessions is not None:
+                # The next run starts from a new connection
+                self.sessions.discard(self.config["port"])
+            raise
+        finally:
+            if self.sessions is None:
+                self.supply.close()
+            if self.journal is not None:
+                self.journal.close()
+            if self.compiled is not None:
+                self.compiled.close()
+        if t is not None:
+            self.log("Telemetry: {} samples ({} missed, {} queries "
+                     "unanswered) saved to {}".format(
+                         t.samples, t.missed, t.unanswered, t.path), INFO)
+
+    def report_timing(self, r, timing):
+        if timing is None:
+            return
+        summary = timing.summary()
+        self.events.put((TIMING, (r, summary)))
+        self.log(format_summary(summary), INFO)
+        if self.timing_path is not None:
+            path = self.timing_path
+            if self.repeats != 1:
+                root, ext = os.path.splitext(path)
+                path = '{}-{}{}'.format(root, r + 1, ext)
+            timing.export(path)
+
+    def duration(self):
+        # Time from the first to the last point of the profile.
+        if self.compiled is not None:
+            ts = self.compiled.times
+        elif self.points is not None:
+            return self.points.duration()
+        else:
+            ts = self.ts
+        return ts[-1] - ts[0] if len(ts) else 0
+
+    def applied(self, r, i, n, t):
+        # Point i of n, at time t of repetition r, has just been applied.
+        if self.journal is not None:
+            self.journal.append(r, i, self.supply.scheduler.deadline,
+                                self.supply.setpoint)
+        self.events.put((PROGRESS, (r, i, n, self.name, t)))
+
+    def restore(self, position, n):
+        # Prepare to resume after position, the last point of a journal:
+        # its setpoint replaces that of the setup commands. Returns the
+        # repetition and the index to go on from.
+        r, i, scheduled, v = position
+        s = self.supply
+        c = self.driver.setpoint(v, self.current_mode)
+        name = c.partition(' ')[0]
+        comms = [c if x.partition(' ')[0] == name else x
+                 for x in s.setup_comms]
+        if c not in comms:
+            comms.append(c)
+        s.setup_comms = comms
+        if self.current_mode:
+            s.c = v
+        else:
+            s.v = v
+        self.log("Resuming after point {} of repetition {} ({:.3f} s), "
+                 "restoring {}".format(i + 1, r + 1, scheduled, c), INFO)
+        i += 1
+        if i >= n:
+            r, i = r + 1, 0
+        return r, i
+
+    def listed(self, period):
+        # The compiled profile to upload to the supply, if it is to be
+        # played from list memory. Lists always start from their first
+        # point, so not when resuming.
+        if not self.use_list or not self.driver.can(drivers.LIST) \
+           or self.points is not None \
+           or self.journal is not None and self.journal.last is not None:
+            return None
+        profile = self.compiled
+        if profile is None:
+            profile = compiler.compile_series(
+                self.ts, self.vs, self.driver.syntax(self.current_mode))
+        if not self.driver.fits(profile, period, self.repeats):
+            self.log("The profile has too many points or too short steps "
+                     "for the list memory of the supply, streaming it", INFO)
+            return None
+        return profile
+
+    def upload(self, profile, period):
+        self.log("Uploading {} points to the list memory of the supply"
+                 .format(len(profile)), INFO)
+        for c in self.driver.upload(profile, period, self.repeats,
+                                    self.current_mode):
+            self.supply.write_command(c)
+        if self.supply.transport is not None:
+            self.supply.transport.flush()
+
+    def play(self):
+        s = self.supply
+        if self.compiled is not None:
+            n = len(self.compiled)
+        elif self.points is not None:
+            n = len(self.points)
+        else:
+            n = len(self.ts)
+        period = self.period
+        if period is None:
+            period = default_period(self.duration(), s.sleep_time,
+                                    self.points)
+        period = max(period, s.sleep_time)
+        r = start = 0
+        position = None
+        if self.journal_path is not None:
+            self.journal = journal.Journal(self.journal_path)
+            self.journal.open(self.current_mode, n, period, self.resume)
+            position = self.journal.last
+        if position is not None:
+            r, start = self.restore(position, n)
+        if self.points is not None and n > TIMED_POINTS:
+            self.log("The profile has too many points to record the timing "
+                     "of each one", INFO)
+        listed = self.listed(period)
+        s.setup()
+        if listed is not None:
+            self.upload(listed, period)
+        # Every repetition is scheduled from the same time base: cycle r
+        # starts at t0 + r*period, whatever happened in earlier cycles.
+        t0 = self.sync() if self.sync is not None else time.monotonic()
+        if t0 is None:
+            return
+        if position is not None:
+            # As if the last point recorded had just been applied
+            t0 -= position[2]
+        if listed is not None:
+            for c in self.driver.trigger():
+                s.write_command(c)
+        if self.journal is not None:
+            self.journal.start(t0)
+            s.waiting = lambda deadline: self.journal.tick(time.monotonic())
+        if s.telemetry is not None:
+            s.telemetry.start(t0, resume=position is not None)
+        if self.repeats:
+            end = time.time() + (t0 - time.monotonic()) + self.repeats*period
+            self.log("{} cycles of {:g} s, ending at {}".format(
+                self.repeats, period,
+                time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(end))),
+                INFO)
+        previous = None
+        while (not self.repeats or r < self.repeats) and not self.stopped:
+            s.progress = lambda i, t, r=r: self.applied(r, i, n, t)
+            cycle_t0 = t0 + r*period
+            if listed is not None:
+                s.runlist(listed, self.current_mode, cycle_t0)
+            elif self.compiled is not None:
+                s.runcompiled(self.compiled, self.current_mode, cycle_t0,
+                              start)
+            elif self.points is not None:
+                s.runpoints(self.points, self.current_mode, cycle_t0, start)
+            else:
+                s.runseries(self.ts, self.vs, self.current_mode, cycle_t0,
+                            start)
+            start = 0
+            drift = s.scheduler.first_late
+            if drift is not None:
+                self.events.put((CYCLE, (r, drift)))
+                self.log("Cycle {}{}: started {:.3f} ms late".format(
+                    r + 1, " of {}".format(self.repeats) if self.repeats else "",
+                    drift*1000), INFO)
+            # The timing of a cycle is reported once the replies to its last
+            # commands have had the whole next cycle to arrive.
+            if previous is not None:
+                self.report_timing(*previous)
+            previous = (r, s.timing)
+            r += 1
+        if listed is not None:
+            # The last point of the list lasts until the end of the period
+            if not self.stopped:
+                wait_until(t0 + r*period, lambda: self.stopped,
+                           idle=s.idle)
+            for c in self.driver.abort(self.current_mode):
+                s.write_command(c)
+        s.progress = s.waiting = None
+        if s.transport is not None:
+            s.transport.flush()
+        if previous is not None:
+            self.report_timing(*previous)
+        s.PV(0)
+        s.PC(0)
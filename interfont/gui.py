@@ -0,0 +1,861 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# The graphical interface: python3 -m interfont
+#
+# Matplotlib takes a while to import, so it is only loaded when the first
+# profile is plotted.
+
+import tkinter as tk
+from tkinter import ttk
+
+import numpy as np
+
+import json
+import queue
+import serial
+import threading
+import traceback
+
+from . import engine
+from .calibrate import CalibrationError, apply_calibration, calibrate
+from .decimate import minmax_decimate
+from .drivers import DRIVERS, Driver
+from .engine import PlaybackEngine, open_serial
+from .isolate import ProcessEngine
+from .profiles import load_csv, expand_pwl
+from .session import SessionManager
+from .waveforms import load_waveform
+
+# How often the GUI collects events and log lines from a running engine,
+# which is also the longest the playback cursor waits to move
+POLL_MS = 50
+# Lines kept in the console
+CONSOLE_LINES = 1000
+# Fraction of the visible time kept by each zoom-in step of the mouse wheel
+ZOOM_STEP = 0.8
+
+class Option():
+    def __init__(self, parent, row, col, text, kind='text'):
+        self.label = tk.Label(parent, text = text)
+        self.label.grid(row = row, column = col, sticky=tk.W)
+                
+        if kind == 'text': 
+            self.entry = tk.Entry(parent, width=10)
+            self.entry.grid(row = row, column = col + 1, sticky=tk.E)
+            
+    def get(self):
+        return self.entry.get()
+    
+    def set(self, text):
+        self.entry.delete(0, tk.END)
+        return self.entry.insert(tk.END, text)
+    
+    def disable(self):
+        self.entry.config(state=tk.DISABLED)
+        
+    def enable(self):
+        self.entry.config(state=tk.NORMAL)
+        
+class SupplyFrame (ttk.Labelframe):
+    def __init__(self, parent, row, col):
+        ttk.Labelframe.__init__(self, parent, 
+                                text="Configurar fuente", 
+                                padding = "3 3 12 12")
+        self.parent = parent
+        self.grid(row = row, column = col)
+                
+        self.configlabel = tk.Label(self, text="Parámetros de la fuente")
+        self.configlabel.grid(row=0, column=0, columnspan = 2)
+        
+        self.baudrate = Option(self, 1, 0, "Baud rate")
+        self.baudrate.set('9600')
+        self.sleeptime = Option(self, 2, 0, "Sleep time")
+        self.sleeptime.set('100')
+        self.pvsyntax = Option(self, 3, 0, "PV syntax")
+        self.pvsyntax.set('PV {:06.3f}')
+        self.pcsyntax = Option(self, 4, 0, "CV syntax")
+        self.pcsyntax.set('PC {:06.2f}')
+        self.port = Option(self, 5, 0, "Puerto")
+        self.port.set('/dev/ttyUSB0')
+        self.timeout = Option(self, 6, 0, "Timeout")
+        self.timeout.set('100')
+        
+        self.savebutton = tk.Button(self, width = 6,
+                                      text="Guardar",
+                                      command=self.saveconfig)
+        self.savebutton.grid(row=7, column=0, sticky=tk.N)
+        
+        self.loadbutton = tk.Button(self, width = 6,
+                                      text="Cargar",
+                                      command=self.loadconfig)
+        self.loadbutton.grid(row=7, column=1, sticky=tk.N)
+        
+        self.calibratebutton = tk.Button(self, width = 6,
+                                      text="Calibrar",
+                                      command=self.calibrate)
+        self.calibratebutton.grid(row=8, column=0, sticky=tk.N)
+        self.calibration = {}
+        
+        # Model of supply (see drivers.py), choosing one fills in its syntax
+        self.driverlabel = tk.Label(self, text="Modelo")
+        self.driverlabel.grid(row=9, column=0, sticky=tk.W)
+        self.driver = ttk.Combobox(self, width=14, state='readonly',
+                                   values=sorted(DRIVERS))
+        self.driver.set(Driver.name)
+        self.driver.grid(row=9, column=1, sticky=tk.E)
+        self.driver.bind('<<ComboboxSelected>>', self.select_driver)
+    
+                
+        self.setuplabel = tk.Label(self, text="Comandos de setup:")
+        self.setuplabel.grid(row=0, column = 3)
+        self.setuptext = tk.Text(self, width=20,height=10)
+        self.setuptext.grid(row=1, column = 3, rowspan=8)
+        self.set_setup_comms([])
+        
+        self.scrollbar= tk.Scrollbar(self, command=self.setuptext.yview)
+        self.scrollbar.grid(row=1, column=4, rowspan=8,sticky='nsew')
+        self.setuptext['yscrollcommand'] = self.scrollbar.set
+            
+    def disable(self):
+        self.baudrate.disable()
+        self.sleeptime.disable()
+        self.pvsyntax.disable()
+        self.pcsyntax.disable()
+        self.port.disable()
+        self.timeout.disable()
+        self.savebutton.config(state=tk.DISABLED)
+        self.loadbutton.config(state=tk.DISABLED)
+        self.calibratebutton.config(state=tk.DISABLED)
+        self.driver.config(state=tk.DISABLED)
+        self.setuptext.config(state=tk.DISABLED)
+        
+    def enable(self):
+        self.baudrate.enable()
+        self.sleeptime.enable()
+        self.pvsyntax.enable()
+        self.pcsyntax.enable()
+        self.port.enable()
+        self.timeout.enable()
+        self.savebutton.config(state=tk.NORMAL)
+        self.loadbutton.config(state=tk.NORMAL)
+        self.calibratebutton.config(state=tk.NORMAL)
+        self.driver.config(state='readonly')
+        self.setuptext.config(state=tk.NORMAL)
+    
+    def get_setup_comms(self):
+        text = self.setuptext.get("0.0", tk.END)
+        comms = []
+        for l in text.split("\n"):
+            if l != "":
+                comms.append(l)
+        return comms
+    
+    def set_setup_comms(self, comms):
+        self.setuptext.delete("0.0", tk.END)
+        for l in comms:
+            if l != "":
+                self.setuptext.insert(tk.END, l + "\n")
+            
+    def select_driver(self, event=None):
+        driver = DRIVERS[self.driver.get()]
+        self.pvsyntax.set(driver.pvsyntax)
+        self.pcsyntax.set(driver.pcsyntax)
+        
+    def get(self, field):
+        fields = {"driver":self.driver.get(),
+                  "baudrate":self.baudrate.get(),
+                  "sleeptime":self.sleeptime.get(),
+                  "pvsyntax":self.pvsyntax.get(),
+                  "pcsyntax":self.pcsyntax.get(),
+                  "port":self.port.get(),
+                  "timeout":self.timeout.get(),
+                  "setup_comms":self.get_setup_comms()}
+        return fields[field]
+        
+    def saveconfig(self):
+        title = "Guardar configuración de fuente"
+        f = tk.filedialog.asksaveasfilename(parent = self,
+                                            title = title,
+                                            defaultextension = ".json")
+
+        if type(f) == str:
+            config = {"driver":self.get("driver"),
+                      "baudrate":self.get("baudrate"),
+                      "sleeptime":self.get("sleeptime"),
+                      "pvsyntax":self.get("pvsyntax"),
+                      "pcsyntax":self.get("pcsyntax"),
+                      "port":self.get("port"),
+                      "timeout":self.get("timeout"),
+                      "setup_comms":self.get_setup_comms()}
+            if self.calibration:
+                config["calibration"] = self.calibration
+            with open(f, 'w') as file:
+                json.dump(config, file) 
+            print("saved")
+        
+    def loadconfig(self):
+        title = "Cargar configuración de fuente"
+        f = tk.filedialog.askopenfile(parent = self,
+                                      title = title,
+                                      mode='r')
+        if f != None: # if a file is selected
+            config = json.load(f)
+            self.driver.set(config.get("driver", Driver.name))
+            self.baudrate.set(config["baudrate"])
+            self.sleeptime.set(config["sleeptime"])
+            self.pvsyntax.set(config["pvsyntax"])
+            self.pcsyntax.set(config["pcsyntax"])
+            self.port.set(config["port"])
+            self.timeout.set(config.get("timeout", config["sleeptime"]))
+            self.set_setup_comms(config["setup_comms"])
+            self.calibration = config.get("calibration", {})
+            print("loaded")
+            
+    def calibrate(self):
+        # Measure the command rate of the supply on a worker thread and
+        # fill in the sleep time and timeout with the result.
+        config = self.parent.get_config()
+        # Calibration uses the port on its own
+        self.parent.sessions.discard(config["port"])
+        self.disable()
+        self.calibrated = queue.Queue()
+        worker = threading.Thread(target=self.calibrate_worker,
+                                  args=(config,), daemon=True)
+        worker.start()
+        self.poll_calibration()
+        
+    def calibrate_worker(self, config):
+        try:
+            ser = open_serial(config)
+            try:
+                self.calibrated.put(calibrate(ser, config))
+            finally:
+                ser.close()
+        except (serial.SerialException, CalibrationError) as e:
+            self.calibrated.put(e)
+            
+    def poll_calibration(self):
+        try:
+            result = self.calibrated.get_nowait()
+        except queue.Empty:
+            self.after(POLL_MS, self.poll_calibration)
+            return
+        self.enable()
+        if isinstance(result, Exception):
+            text = """Error: no se ha podido calibrar la fuente.
+
+{}""".format(result)
+            error = InfoDialog(self, text, "Error!")
+            self.parent.wait_window(error)
+        else:
+            config = apply_calibration({}, result)
+            self.sleeptime.set(config["sleeptime"])
+            self.timeout.set(config["timeout"])
+            self.calibration = config["calibration"]
+            self.parent.progframe.console_write(
+                "Calibrado: {} ms".format(config["sleeptime"]))
+        
+        
+        
+class ProgFrame (ttk.Labelframe):
+    def __init__(self, parent, row, col):
+        ttk.Labelframe.__init__(self, parent, 
+                                text="Programar fuente", 
+                                padding = "3 3 12 12")
+        self.parent = parent
+        self.grid(row = row, column = col)
+            
+        # Load file
+        self.label = tk.Label(self, text='Cargar un archivo csv')
+        self.label.grid(row=0,column=0, columnspan=2)
+        
+        self.filenameentry = tk.Entry(self, width=16)
+        self.filenameentry.grid(row=1,column=0, columnspan=2)
+        self.filenameentry.insert(tk.END, 'pwl.csv')
+    
+        self.seriesbutton = tk.Button(self, text="Steps", width=5,
+                                      command=self.loadseries)
+        self.seriesbutton.grid(row=2,column=0)
+        
+        self.pwlbutton = tk.Button(self, text="Rampas", width=5,
+                                   command=self.loadpwl)
+        self.pwlbutton.grid(row=2,column=1)
+                
+        # Current mode selection
+        self.currentmode = tk.BooleanVar()
+        self.currentmode.set(False)
+        self.vmodesel = tk.Radiobutton(self,
+                                    text = "Modo tensión",
+                                    variable=self.currentmode,
+                                    value=False,
+                                    command=parent.update_waveform)
+        self.vmodesel.grid(row=3, column=0, columnspan=2)
+        self.cmodesel = tk.Radiobutton(self,
+                                    text = "Modo corriente",
+                                    variable=self.currentmode,
+                                    value=True,
+                                    command=parent.update_waveform)
+        self.cmodesel.grid(row=4, column=0, columnspan=2)
+        
+        self.repeatlabel = tk.Label(self, text="Repeticiones")
+        self.repeatlabel.grid(row=5, column = 0)
+        
+        self.repeatentry = tk.Spinbox(self, from_=1, to=1000, width=3)
+        self.repeatentry.grid(row=5,column=1)
+        
+        # Repeat until the Stop button is pressed
+        self.endless = tk.BooleanVar()
+        self.endless.set(False)
+        self.endlesscheck = tk.Checkbutton(self, text="Sin fin",
+                                           variable=self.endless)
+        self.endlesscheck.grid(row=6, column=0, columnspan=2)
+        
+        self.cyclelabel = tk.Label(self, text="")
+        self.cyclelabel.grid(row=7, column=0, columnspan=4)
+        
+        # Simplify the profile to within this many V (or A), empty for no
+        self.tolerancelabel = tk.Label(self, text="Tolerancia")
+        self.tolerancelabel.grid(row=8, column=0)
+        self.toleranceentry = tk.Entry(self, width=5)
+        self.toleranceentry.grid(row=8, column=1)
+        
+        # Play in a separate process (see isolate.py), so that the plot
+        # doesn't disturb the timing
+        self.isolated = tk.BooleanVar()
+        self.isolated.set(False)
+        self.isolatedcheck = tk.Checkbutton(self, text="Proceso aislado",
+                                            variable=self.isolated)
+        self.isolatedcheck.grid(row=9, column=0, columnspan=2)
+        
+        # A waveform defined by a formula instead of a file of points
+        self.wavebutton = tk.Button(self, text="Forma de onda",
+                                    command=self.loadwaveform)
+        self.wavebutton.grid(row=10, column=0, columnspan=2)
+        
+        # TODO canviar consola per un text gran amb bg i tal
+        self.consolelabel = tk.Label(self, text="Consola:")
+        self.consolelabel.grid(row=0, column = 2)
+        self.consoletext = tk.Text(self, width=20,height=10)
+        self.consoletext.grid(row=1, column = 2, rowspan=6)
+        self.consoletext.config(state=tk.DISABLED)
+    
+    
+        self.scrollbar= tk.Scrollbar(self, command=self.consoletext.yview)
+        self.scrollbar.grid(row=1, column=3, rowspan=6,sticky='nsew')
+        self.consoletext['yscrollcommand'] = self.scrollbar.set
+        
+    def disable(self):
+        self.filenameentry.config(state=tk.DISABLED)
+        self.seriesbutton.config(state=tk.DISABLED)
+        self.pwlbutton.config(state=tk.DISABLED)
+        self.vmodesel.config(state=tk.DISABLED)
+        self.cmodesel.config(state=tk.DISABLED)
+        self.repeatentry.config(state=tk.DISABLED)
+        self.endlesscheck.config(state=tk.DISABLED)
+        self.toleranceentry.config(state=tk.DISABLED)
+        self.isolatedcheck.config(state=tk.DISABLED)
+        self.wavebutton.config(state=tk.DISABLED)
+        
+    def enable(self):
+        self.filenameentry.config(state=tk.NORMAL)
+        self.seriesbutton.config(state=tk.NORMAL)
+        self.pwlbutton.config(state=tk.NORMAL)
+        self.vmodesel.config(state=tk.NORMAL)
+        self.cmodesel.config(state=tk.NORMAL)
+        self.repeatentry.config(state=tk.NORMAL)
+        self.endlesscheck.config(state=tk.NORMAL)
+        self.toleranceentry.config(state=tk.NORMAL)
+        self.isolatedcheck.config(state=tk.NORMAL)
+        self.wavebutton.config(state=tk.NORMAL)
+        
+    def get(self, field):
+        fields = {"currentmode":self.currentmode.get(),
+                  "repeat":self.repeatentry.get(),
+                  "endless":self.endless.get(),
+                  "tolerance":self.toleranceentry.get(),
+                  "isolated":self.isolated.get()}
+        return fields[field]
+    
+    def loadpwl(self):
+        self.loadfile(pwl=True)
+        
+    def loadseries(self):
+        self.loadfile(pwl=False)
+                
+    def loadfile(self, pwl = False):
+        if pwl:
+            title = "Seleccionar archivo de rampas en CSV"
+        else:
+            title = "Seleccionar archivo de escalones en CSV"
+            
+        f = tk.filedialog.askopenfilename(parent = self,
+                                          title = title,
+                                          defaultextension = ".csv")
+
+        if f:
+            # Large files are parsed on a worker thread so the window keeps
+            # responding; the result is picked up by poll_load.
+            self.disable()
+            self.loaded = queue.Queue()
+            loader = threading.Thread(target=self.load_worker,
+                                      args=(f,), daemon=True)
+            loader.start()
+            self.poll_load(f, pwl)
+            
+    def loadwaveform(self):
+        f = tk.filedialog.askopenfilename(
+            parent = self,
+            title = "Seleccionar forma de onda en JSON",
+            defaultextension = ".json")
+        if not f:
+            return
+        # Only the formula is read, the points are computed when needed
+        min_trans = float(self.parent.supplyframe.sleeptime.get())/1000
+        try:
+            waveform = load_waveform(f, min_trans)
+        except (OSError, ValueError) as e:
+            error = InfoDialog(self, "Error: {}".format(e), "Error!")
+            self.parent.wait_window(error)
+            return
+        self.parent.source = None
+        self.parent.loadwaveform(waveform)
+            
+    def load_worker(self, f):
+        try:
+            self.loaded.put(load_csv(f, use_mmap=True))
+        except (OSError, ValueError) as e:
+            self.loaded.put(e)
+            
+    def poll_load(self, f, pwl):
+        try:
+            result = self.loaded.get_nowait()
+        except queue.Empty:
+            self.after(POLL_MS, self.poll_load, f, pwl)
+            return
+        self.enable()
+        if isinstance(result, Exception):
+            text = """Error: deben haber tantos valores de tiempo como de tensión/corriente, en orden creciente de tiempo.
+
+{}""".format(result)
+            error = InfoDialog(self, text, "Error!")
+            self.parent.wait_window(error)
+        else:
+            self.parent.source = (f, pwl)
+            if pwl:
+                self.parent.loadpwl(*result)
+            else:
+                self.parent.loadseries(*result)
+            
+    def show_cycle(self, r, drift):
+        self.cyclelabel.config(
+            text="Ciclo {}, deriva {:.2f} ms".format(r + 1, drift*1000))
+        
+    def console_write(self, text):
+        self.console_write_lines([text])
+        
+    def console_write_lines(self, lines):
+        # Append a batch of lines with a single insert, keeping only the
+        # last CONSOLE_LINES lines in the widget.
+        if not lines:
+            return
+        self.consoletext.config(state=tk.NORMAL)
+        self.consoletext.insert(tk.END, "\n".join(lines) + "\n")
+        excess = int(self.consoletext.index('end-1c').split('.')[0]) \
+                 - CONSOLE_LINES
+        if excess > 0:
+            self.consoletext.delete("1.0", "{}.0".format(excess + 1))
+        self.consoletext.see(tk.END)
+        self.consoletext.config(state=tk.DISABLED)
+        
+    def get_console(self):
+        return self.console_write
+    
+            
+class WaveformFrame (ttk.Frame):
+    def __init__(self, parent, row, col):
+        ttk.Frame.__init__(self, parent, padding = "3 3 12 12")
+        self.parent = parent
+        self.grid(row=row, column=col, columnspan=2,
+                  sticky=(tk.E, tk.W, tk.N, tk.S))
+   
+
+        self.runbutton = tk.Button(self, 
+                                   text='Ejecutar',
+                                   command=self.runwaveform)
+        self.runbutton.grid(row = 1, column = 0, sticky = tk.E)
+        
+        self.stopbutton = tk.Button(self, 
+                                   text='Stop',
+                                   command=self.stopwaveform)
+        self.stopbutton.grid(row = 1, column = 1, sticky = tk.W)
+        self.running_mode(False)
+        
+        self.helpbutton = tk.Button(self, 
+                                   text='Ayuda',
+                                   command=self.show_help)
+        self.helpbutton.grid(row = 1, column = 3, sticky = tk.E)
+        
+        self.running_mode(False)
+        
+        # Until a profile is loaded there is nothing to plot
+        self.figure = None
+        self.placeholder = tk.Label(self, text="Cargar un perfil para verlo",
+                                    height=10)
+        self.placeholder.grid(row=0, column=0, columnspan=4)
+        
+    def build_plot(self):
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+        from matplotlib.figure import Figure
+        
+        self.placeholder.destroy()
+        # The figure and canvas are built once; update() and zooming only
+        # replace the data of the plotted line.
+        self.figure = Figure(figsize=(6, 2), dpi=100, facecolor='none',
+                             tight_layout=True)
+        self.axes = self.figure.add_subplot(111)
+        self.axes.set_xlabel('Tiempo (s)')
+        self.line, = self.axes.step([], [], '-', where='post')
+        self.canvas = FigureCanvasTkAgg(self.figure, master=self)
+        self.canvas._tkcanvas.grid(row=0,column=0, columnspan=4,
+                                   sticky = tk.E)
+        # Scroll to zoom around the pointer, double click to see it all
+        self.canvas.mpl_connect('scroll_event', self.zoom)
+        self.canvas.mpl_connect('button_press_event', self.reset_zoom)
+        
+        # The playback position and the part of the profile applied so far
+        # are animated: they are left out of full redraws and blitted over a
+        # copy of the rest of the plot, so moving them costs next to nothing.
+        self.cursor = self.axes.axvline(0, color='tab:red', linewidth=1,
+                                        animated=True)
+        self.applied, = self.axes.step([], [], '-', where='post',
+                                       color='tab:orange', linewidth=2,
+                                       animated=True)
+        self.position = None
+        self.background = None
+        self.canvas.mpl_connect('draw_event', self.on_draw)
+        
+    def on_draw(self, event):
+        self.background = self.canvas.copy_from_bbox(self.axes.bbox)
+        self.draw_position()
+        
+    def show_position(self, t):
+        # Move the cursor to profile time t, or hide it if t is None.
+        if self.figure is None:
+            return
+        self.position = t
+        if t is None:
+            self.canvas.draw_idle()
+        else:
+            self.draw_position()
+        
+    def draw_position(self):
+        t = self.position
+        if t is None or self.background is None:
+            return
+        self.canvas.restore_region(self.background)
+        self.cursor.set_xdata([t, t])
+        # The applied part is the plotted (decimated) line up to t
+        xs, ys = self.line.get_data()
+        k = np.searchsorted(xs, t, 'right')
+        if k:
+            self.applied.set_data(np.append(xs[:k], t),
+                                  np.append(ys[:k], ys[k-1]))
+        else:
+            self.applied.set_data([], [])
+        self.axes.draw_artist(self.applied)
+        self.axes.draw_artist(self.cursor)
+        self.canvas.blit(self.axes.bbox)
+            
+    def update(self):
+        if self.figure is None:
+            self.build_plot()
+        self.waveform = self.parent.waveform
+        if self.waveform is not None:
+            # Only sampled, a window at a time (see show_window)
+            self.xs, self.ys = self.waveform.sample(
+                0, self.waveform.duration())
+        else:
+            self.xs = np.asarray(self.parent.ts, dtype=np.float64)
+            self.ys = np.asarray(self.parent.vs, dtype=np.float64)
+        
+        if self.parent.progframe.get('currentmode'):
+            self.axes.set_ylabel('Corriente (A)')
+        else:
+            self.axes.set_ylabel('Voltage (V)')
+        if len(self.ys) > 0:
+            low, high = self.ys.min(), self.ys.max()
+            margin = 0.05*(high - low) or 0.5
+            self.axes.set_ylim(low - margin, high + margin)
+        self.reset_zoom()
+        
+    def reset_zoom(self, event=None):
+        if event is not None and not event.dblclick:
+            return
+        if self.waveform is not None:
+            self.show_window(0, self.waveform.duration())
+        elif len(self.xs) > 0:
+            self.show_window(self.xs[0], self.xs[-1])
+        
+    def zoom(self, event):
+        if event.xdata is None:
+            return
+        factor = ZOOM_STEP if event.button == 'up' else 1/ZOOM_STEP
+        t0, t1 = self.axes.get_xlim()
+        x = event.xdata
+        self.show_window(x - (x - t0)*factor, x + (t1 - x)*factor)
+        
+    def show_window(self, t0, t1):
+        # Plot the part of the profile between t0 and t1, decimated to the
+        # width of the axes in pixels.
+        if t1 <= t0:
+            t1 = t0 + 1
+        pixels = max(1, int(self.axes.bbox.width))
+        xs, ys = self.xs, self.ys
+        if self.waveform is not None:
+            xs, ys = self.waveform.sample(t0, t1)
+        xs, ys = minmax_decimate(xs, ys, t0, t1, pixels)
+        self.line.set_data(xs, ys)
+        self.axes.set_xlim(t0, t1)
+        self.canvas.draw_idle()
+        
+    def runwaveform(self):
+        self.parent.runwaveform()
+        
+    def stopwaveform(self):
+        self.parent.stopwaveform()
+        
+    def show_help(self):
+        
+        text = """
+Sleep time es el tiempo que el programa esperará entre el envío de dos comandos consecutivos. Si no se espera el tiempo suficiente es posible que la fuente ignore el segundo comando. El programa utilizarà este comando para crear las rampas a partir del archivo CSV, si se utiliza esta opción. Si en el archivo se especifican intervalos de tiempo más cortos que el sleep time es posible que se pierdan puntos del perfil.
+
+Timeout es el tiempo máximo que se espera la respuesta de la fuente a un comando antes de enviar el siguiente. El botón Calibrar mide la velocidad a la que la fuente acepta comandos y ajusta el sleep time y el timeout.
+
+Los campos PV syntax y PC syntax deben contener la síntaxis que debe seguir el programa para programar tensión y corriente, en forma de string formateable por Python.
+Por ejemplo, PV {:06.3f} enviará comandos formados por los carácteres PV, un espacio y el valor de tensión o corriente usando 6 carácteres, 3 de ellos dedicados a la parte decimal, de manera que el programa utilizará el comando PV 05.000 para programar 5 V.
+
+El modelo indica qué comandos acepta la fuente. Las fuentes con memoria de lista (lambda-zplus) reciben el perfil entero antes de empezar y lo ejecutan con su propio reloj si cabe en la memoria; si no, los puntos se envían uno a uno como en las demás.
+
+Los comandos de setup se ejecutarán antes de cada perfil. Puede usarse esta opción para enviar comandos que configuren la fuente en modo remoto, o configurar la corriente antes de programar un perfil en tensión o viceversa.
+
+Consultar el manual de la fuente para encontrar los parámetros adecuados.
+"""
+        helpwindow = InfoDialog(self, text, title="Ayuda")
+        self.parent.wait_window(helpwindow)
+        
+    def running_mode(self, running = False):
+        self.running = running
+        if running:
+            self.runbutton.config(state=tk.DISABLED)
+            self.stopbutton.config(state=tk.NORMAL)
+        else:
+            self.runbutton.config(state=tk.NORMAL)
+            self.stopbutton.config(state=tk.DISABLED)
+        
+        
+class MainFrame (ttk.Frame):
+    def __init__(self, parent, row, col):
+        ttk.Frame.__init__(self, parent, padding = "3 3 12 12")
+        
+        parent.report_callback_exception = self.report_callback_exception
+        self.parent= parent
+        self.grid(row=row, column=col, columnspan=2) 
+        self.grid(column=0, row=0, sticky=(tk.N, tk.W, tk.E, tk.S))
+#        self.columnconfigure(0, weight=1)
+#        self.rowconfigure(0, weight=1)
+        
+        self.ts = [0, 1]
+        self.vs = [0, 0]
+        # CSV file and kind (ramps or not) of the loaded profile, if any
+        self.source = None
+        # The waveform (see waveforms.py) to play instead of ts, vs, if any
+        self.waveform = None
+        # The ports stay open between runs
+        self.sessions = SessionManager()
+        self.engine = None
+        parent.protocol("WM_DELETE_WINDOW", self.on_close)
+        
+        self.supplyframe = SupplyFrame(self, 0, 0)
+        self.progframe = ProgFrame(self, 0, 1)
+        self.waveformframe = WaveformFrame(self, 1, 0)
+        
+        
+    def loadpwl(self, tws, vws):
+        # Calculate minimum transition time
+        min_trans = float(self.supplyframe.sleeptime.get())/1000
+        ts, vs = expand_pwl(tws, vws, min_trans)
+        self.loadseries(ts, vs)
+    
+    def update_waveform(self):
+        self.waveformframe.update()
+        
+    def loadseries(self, ts, vs):
+        self.ts = ts
+        self.vs = vs
+        self.waveform = None
+        self.update_waveform()
+        
+    def loadwaveform(self, waveform):
+        self.waveform = waveform
+        self.update_waveform()
+        
+    def disable(self):
+        self.supplyframe.disable()
+        self.progframe.disable()
+        self.waveformframe.running_mode(True)
+    
+    def enable(self):
+        self.supplyframe.enable()
+        self.progframe.enable()
+        self.waveformframe.running_mode(False)
+        
+    def get_config(self):
+        return {"driver":self.supplyframe.get("driver"),
+                "baudrate":self.supplyframe.get("baudrate"),
+                "sleeptime":self.supplyframe.get("sleeptime"),
+                "pvsyntax":self.supplyframe.get("pvsyntax"),
+                "pcsyntax":self.supplyframe.get("pcsyntax"),
+                "port":self.supplyframe.get("port"),
+                "timeout":self.supplyframe.get("timeout"),
+                "setup_comms":self.supplyframe.get_setup_comms()}
+        
+    def runwaveform(self):
+        cm = self.progframe.get("currentmode")
+        repeats = int(self.progframe.get("repeat"))
+        if self.progframe.get("endless"):
+            repeats = 0
+        tolerance = self.progframe.get("tolerance").strip()
+        tolerance = float(tolerance) if tolerance else None
+        config = self.get_config()
+        ts, vs, points = self.ts, self.vs, None
+        if self.waveform is not None:
+            ts = vs = None
+            points = self.waveform
+        if self.progframe.get("isolated"):
+            # The playback process opens the port itself
+            self.sessions.discard(config["port"])
+            self.engine = ProcessEngine(config, ts, vs,
+                                        current_mode=cm,
+                                        repeats=repeats,
+                                        points=points,
+                                        source=self.source,
+                                        tolerance=tolerance)
+        else:
+            self.engine = PlaybackEngine(config, ts, vs,
+                                         current_mode=cm,
+                                         repeats=repeats,
+                                         points=points,
+                                         source=self.source,
+                                         tolerance=tolerance,
+                                         sessions=self.sessions)
+        self.disable()
+        self.engine.start()
+        self.poll_engine()
+        
+    def poll_engine(self):
+        # Show what the engine has logged and reported since the last call,
+        # and keep polling while it runs.
+        console = self.progframe.console_write_lines
+        console(self.engine.runlog.drain())
+        # Only the latest position is drawn, once per poll
+        position = None
+        while True:
+            try:
+                kind, payload = self.engine.events.get_nowait()
+            except queue.Empty:
+                break
+            if kind == engine.PROGRESS:
+                position = payload[4]
+            elif kind == engine.CYCLE:
+                self.progframe.show_cycle(*payload)
+            elif kind == engine.DONE:
+                console(self.engine.runlog.drain())
+                print("Execution completed")
+                self.waveformframe.show_position(None)
+                self.enable()
+                return
+            elif kind == engine.ERROR:
+                console(self.engine.runlog.drain())
+                self.waveformframe.show_position(None)
+                self.enable()
+                self.show_engine_error(payload)
+                return
+        if position is not None:
+            self.waveformframe.show_position(position)
+        self.after(POLL_MS, self.poll_engine)
+        
+    def show_engine_error(self, e):
+        print(e)
+        if not isinstance(e, serial.SerialException):
+            raise e
+        text = """Error: Fuente no encontrada. Revisar las conexiones.
+                
+        Si el sistema operativo es Windows usar el administrador de dispositivos para ver los puertos en uso.
+        
+        Si el sistema operativo es Linux usar ls -al /dev para ver los dispositivos tty conectados. Si el puerto pertenece a root cambiar el propietario con chown o ejecutar esta aplicación como sudoer."""
+        info = InfoDialog(self.parent, text, title="Error!")
+        self.parent.wait_window(info)
+        
+    def stopwaveform(self):
+        self.engine.stop()
+        
+    def on_close(self):
+        if self.engine is not None and self.engine.running():
+            self.engine.stop()
+            self.engine.join()
+        self.sessions.close()
+        self.parent.destroy()
+        
+    def report_callback_exception(self, *args):
+        err = traceback.format_exception(*args)
+        text = """Ha habido una excepción de Python. El texto de la excepción es el siguiente:
+  
+{}
+            
+Si el programa sigue funcionando después de cerrar esta ventana, ignorar este mensaje.
+            """.format(err)
+        
+        error = InfoDialog(self, text, 'Python exception!')
+        self.parent.wait_window(error)
+        
+        
+
+        
+class InfoDialog(tk.Toplevel):
+
+    def __init__(self, parent, text, title):
+        tk.Toplevel.__init__(self, parent)
+        self.parent = parent
+
+        for i, t in enumerate(text.split( "\n")):
+            self.info = tk.Message(self, text=text)
+            self.info.grid(row=0,column=0)
+
+        self.okbutton = tk.Button(self, 
+                                  text="Aceptar", 
+                                  command=self.ok)
+        self.okbutton.grid(row=i+1,column=0)
+        self.title(title)
+        self.grab_set()
+        
+        for child in self.winfo_children(): child.grid_configure(padx=5, pady=5)
+
+    def ok(self):
+        self.destroy()
+
+    
+
+        
+def main():
+    root = tk.Tk()
+    root.title("Interfont")
+    mainframe = MainFrame(root, 0, 0)
+    
+    for child in mainframe.winfo_children(): child.grid_configure(padx=5, pady=5)
+    
+    root.mainloop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Playback in a process of its own, so that the timing of the setpoints
+# does not share the GIL with the GUI (Tk redraws, matplotlib) or with the
+# caller's garbage collection. ProcessEngine is used like PlaybackEngine:
+#
+#   e = ProcessEngine(config, ts, vs, cpu=3)
+#   e.start()
+#   ... e.events, e.runlog as usual ...
+#
+# The profile is compiled in the caller and handed to the playback process
+# in shared memory (in the layout of compiler.py), except for lazy profiles
+# (ramps kept as their breakpoints, waveforms), which are handed over as
+# they are and generated by the playback process as it plays. The processes
+# talk
+# through a pipe, which carries the control messages ('start', 'stop'), the
+# log lines and the occasional events, and through a Ring in shared memory
+# for the progress and telemetry records, which the playback process writes
+# without ever waiting for the caller.
+
+import gc
+import multiprocessing
+import os
+import signal
+import struct
+import threading
+import time
+from multiprocessing import shared_memory
+
+from . import compiler, engine
+from .runlog import RunLog
+
+# Seconds between relays of the log, and between reads of the ring
+REFRESH = 0.1
+# Records the ring holds, several seconds of progress at any pace
+SLOTS = 1 << 14
+
+HEAD = struct.Struct('<Q')
+# Kind (0 progress, 1 telemetry), then (repetition, index, length, time)
+# or (time, setpoint, voltage, current)
+RECORD = struct.Struct('<ddddd')
+
+
+class Ring:
+    # Records of a kind and four doubles in shared memory, written by one
+    # process and read by another. The head counts the records ever
+    # written; the reader keeps its own count and, if it falls more than
+    # the ring behind, loses the oldest records (and is told how many).
+
+    def __init__(self, name=None, slots=SLOTS):
+        if name is None:
+            self.shm = shared_memory.SharedMemory(
+                create=True, size=HEAD.size + slots*RECORD.size)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.name = self.shm.name
+        self.slots = (self.shm.size - HEAD.size)//RECORD.size
+        self.buf = self.shm.buf
+        # Progress and telemetry are written from different threads
+        self.lock = threading.Lock()
+        self.read_count = 0
+
+    def head(self):
+        return HEAD.unpack_from(self.buf)[0]
+
+    def write(self, kind, fields):
+        with self.lock:
+            head = self.head()
+            RECORD.pack_into(self.buf,
+                             HEAD.size + (head % self.slots)*RECORD.size,
+                             kind, *fields)
+            HEAD.pack_into(self.buf, 0, head + 1)
+
+    def read(self):
+        # Return the records written since the last call and how many were
+        # lost in between.
+        head = self.head()
+        lost = max(0, head - self.slots - self.read_count)
+        start = self.read_count + lost
+        records = [RECORD.unpack_from(
+                       self.buf, HEAD.size + (j % self.slots)*RECORD.size)
+                   for j in range(start, head)]
+        # Those overwritten while being read
+        overwritten = max(0, self.head() - self.slots - start)
+        if overwritten:
+            del records[:overwritten]
+            lost += overwritten
+        self.read_count = head
+        return records, lost
+
+    def close(self, unlink=False):
+        self.buf = None
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+
+
+class Relay:
+    # Stands for the engine's event queue in the playback process.
+
+    def __init__(self, conn, ring, runlog):
+        self.conn = conn
+        self.ring = ring
+        self.runlog = runlog
+        self.lock = threading.Lock()
+
+    def send(self, message):
+        with self.lock:
+            self.conn.send(message)
+
+    def flush(self):
+        entries = self.runlog.drain_entries()
+        if entries:
+            self.send(('log', entries))
+
+    def put(self, event):
+        kind, payload = event
+        if kind == engine.PROGRESS:
+            r, i, n, name, t = payload
+            self.ring.write(0, (r, i, n, t))
+        elif kind == engine.MEASURED:
+            self.ring.write(1, payload)
+        else:
+            # The log before the event, so that it comes before 'done'
+            self.flush()
+            if kind == engine.ERROR:
+                try:
+                    self.send(('event', kind, payload))
+                    return
+                except Exception:
+                    payload = RuntimeError(repr(payload))
+            self.send(('event', kind, payload))
+
+
+def serve(conn, profile_name, ring_name, options):
+    # Main function of the playback process. profile_name is the shared
+    # memory of the compiled profile, or None to play options["points"].
+    # The caller decides when to stop, Ctrl-C included
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    cpu = options.pop("cpu")
+    if cpu is not None and hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, {cpu})
+    level = options.pop("level")
+    profile = None
+    if profile_name is not None:
+        # Unlinked by the caller, whose resource tracker it shares
+        shm = shared_memory.SharedMemory(name=profile_name)
+        profile = compiler.from_buffer(shm.buf, source=shm, name=profile_name)
+    ring = Ring(ring_name)
+    runlog = RunLog(level=level)
+    e = engine.PlaybackEngine(compiled=profile, runlog=runlog, **options)
+    e.events = Relay(conn, ring, runlog)
+    started = threading.Event()
+    done = threading.Event()
+
+    def sync():
+        e.events.send(('ready',))
+        started.wait()
+        return None if e.stopped else time.monotonic()
+
+    def control():
+        # Pass on the log and wait for orders from the caller
+        while not done.is_set():
+            try:
+                if conn.poll(REFRESH):
+                    message = conn.recv()
+                    if message == 'stop':
+                        e.stop()
+                    started.set()
+                e.events.flush()
+            except (EOFError, OSError):
+                # The caller is gone
+                e.stop()
+                started.set()
+                return
+
+    e.sync = sync
+    thread = threading.Thread(target=control, daemon=True)
+    thread.start()
+    # Everything allocated so far stays, and the run itself creates little
+    # cyclic garbage: no collections during playback.
+    gc.collect()
+    gc.freeze()
+    gc.disable()
+    try:
+        e.run()
+    finally:
+        done.set()
+        thread.join()
+        ring.close()
+        conn.close()
+
+
+class ProcessEngine(engine.PlaybackEngine):
+    # A PlaybackEngine that plays in a process of its own, pinned to cpu if
+    # one is given. Lazy points must be picklable. The playback process
+    # opens (and closes) the port itself, so sessions and several engines
+    # in sync are not supported.
+
+    def __init__(self, config, ts=None, vs=None, cpu=None, **kwargs):
+        super().__init__(config, ts, vs, **kwargs)
+        if self.sessions is not None or self.sync is not None:
+            raise ValueError('sessions and multiple supplies cannot play in '
+                             'a separate process')
+        self.cpu = cpu
+        self.process = None
+        self.conn = None
+        self.lock = threading.Lock()
+
+    def send(self, message):
+        with self.lock:
+            if self.conn is not None:
+                try:
+                    self.conn.send(message)
+                except OSError:
+                    pass
+
+    def stop(self):
+        self.stopped = True
+        self.send('stop')
+
+    def abort(self):
+        # End the playback process at once, leaving the supply as it is.
+        self.stopped = True
+        if self.process is not None:
+            self.process.terminate()
+
+    def options(self):
+        return {"config": self.config,
+                "current_mode": self.current_mode,
+                "repeats": self.repeats,
+                "period": self.period,
+                "verbose": self.verbose,
+                "name": self.name,
+                "timing_path": self.timing_path,
+                "telemetry_path": self.telemetry_path,
+                "telemetry_rate": self.telemetry_rate,
+                "journal_path": self.journal_path,
+                "resume": self.resume,
+                "use_list": self.use_list,
+                "points": self.points,
+                "level": self.runlog.level,
+                "cpu": self.cpu}
+
+    def execute(self):
+        self.compile()
+        if self.points is not None:
+            ring = Ring()
+            try:
+                self.relay(None, ring)
+            finally:
+                ring.close(unlink=True)
+            return
+        if self.compiled is None:
+            syntax = self.driver.syntax(self.current_mode)
+            simplified = None
+            if self.tolerance is not None:
+                simplified = (self.tolerance,
+                              float(self.config["sleeptime"])/1000, self.shape)
+            self.compiled = compiler.compile_series(self.ts, self.vs, syntax,
+                                                    simplified)
+        shm = shared_memory.SharedMemory(create=True,
+                                         size=compiler.nbytes(self.compiled))
+        ring = None
+        try:
+            compiler.write_into(self.compiled, shm.buf)
+            self.compiled.close()
+            self.compiled = None
+            ring = Ring()
+            self.relay(shm.name, ring)
+        finally:
+            if ring is not None:
+                ring.close(unlink=True)
+            shm.close()
+            shm.unlink()
+
+    def relay(self, profile_name, ring):
+        # Start the playback process and pass on what it sends until it
+        # is done.
+        ctx = multiprocessing.get_context('spawn')
+        conn, child = ctx.Pipe()
+        self.process = ctx.Process(target=serve, daemon=True,
+                                   args=(child, profile_name, ring.name,
+                                         self.options()))
+        self.process.start()
+        child.close()
+        with self.lock:
+            self.conn = conn
+        try:
+            while True:
+                message = None
+                try:
+                    if conn.poll(REFRESH):
+                        message = conn.recv()
+                except EOFError:
+                    self.forward(ring)
+                    if self.stopped:
+                        # Aborted
+                        return
+                    self.process.join(1)
+                    raise RuntimeError(
+                        'the playback process ended unexpectedly (exit code '
+                        '{})'.format(self.process.exitcode))
+                self.forward(ring)
+                if message is None:
+                    continue
+                if message[0] == 'log':
+                    for level, text in message[1]:
+                        self.runlog.write(text, level)
+                elif message[0] == 'ready':
+                    self.send('stop' if self.stopped else 'start')
+                elif message[1] == engine.DONE:
+                    self.stopped = not message[2]
+                    return
+                elif message[1] == engine.ERROR:
+                    raise message[2]
+                else:
+                    self.events.put(message[1:])
+        finally:
+            with self.lock:
+                self.conn = None
+            conn.close()
+            self.process.join(REFRESH*10)
+            if self.process.is_alive():
+                self.process.terminate()
+                self.process.join()
+
+    def forward(self, ring):
+        # Only the latest position, but every measurement
+        records, lost = ring.read()
+        if lost:
+            self.log('{} progress or telemetry records lost'.format(lost),
+                     engine.INFO)
+        progress = None
+        for record in records:
+            if record[0] == 0:
+                progress = record
+            else:
+                self.events.put((engine.MEASURED, record[1:]))
+        if progress is not None:
+            _, r, i, n, t = progress
+            self.events.put((engine.PROGRESS,
+                             (int(r), int(i), int(n), self.name, t)))
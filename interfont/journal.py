@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Record of how far a run got, so that it can be resumed after a crash, a
+# lost connection or a stop instead of starting over. Every point applied
+# is appended to the journal, a block at a time, and a run started with
+# resume picks up after the last point recorded (see engine.PlaybackEngine).
+#
+# File layout (little endian), append only:
+#   header   MAGIC, version, current mode (0 or 1), points per repetition,
+#            period in seconds, start of the run (Unix time)
+#   blocks   of rows, see blockfile.py
+#
+# The columns are COLUMNS: the repetition and the index of the point, when
+# it was due and when it was applied in seconds from the start of the run,
+# and its value. Times are counted on the run's time base, which a resumed
+# run shifts so that they carry on from the last point. A block cut short
+# by a crash is dropped before appending. To look at a journal:
+#
+#   python3 -m interfont.journal run.ifjn --csv run.csv
+
+import argparse
+import csv
+import os
+import struct
+import sys
+import time
+
+from .blockfile import BlockWriter, read_blocks
+
+MAGIC = b'IFJN'
+VERSION = 1
+HEADER = struct.Struct('<4sIIQdd')
+
+COLUMNS = ('repetition', 'index', 'scheduled', 'applied', 'value')
+
+# Rows kept in memory before they are written as a block, and how long, in
+# seconds, the oldest of them is kept at most (see tick): what a crash can
+# lose
+BLOCK_ROWS = 256
+BLOCK_AGE = 1.0
+
+
+class Journal:
+    # Appends the points of a run to a journal file from the playback
+    # thread. open() starts a new journal, or continues an existing one if
+    # resuming; last is then the last point it recorded (see last_point).
+
+    def __init__(self, path, block_rows=BLOCK_ROWS, block_age=BLOCK_AGE):
+        self.path = path
+        self.block_rows = block_rows
+        self.block_age = block_age
+        self.writer = None
+        self.t0 = None
+        self.oldest = None # when the oldest row in memory was appended
+        self.last = None
+
+    def open(self, current_mode, n, period, resume=False):
+        # With resume, an existing journal of the same profile is continued.
+        if resume and os.path.exists(self.path):
+            header, columns, end = read(self.path)
+            if (header["current_mode"], header["points"]) \
+               != (bool(current_mode), n) \
+               or abs(header["period"] - period) > 1e-9:
+                raise ValueError('{} is the journal of another profile'
+                                 .format(self.path))
+            self.last = last_point(columns)
+            f = open(self.path, 'r+b')
+            f.truncate(end)
+            f.seek(end)
+        else:
+            f = open(self.path, 'wb')
+            f.write(HEADER.pack(MAGIC, VERSION, int(current_mode), n, period,
+                                time.time()))
+            f.flush()
+        self.writer = BlockWriter(f, len(COLUMNS), self.block_rows)
+
+    def start(self, t0):
+        # t0 is the time.monotonic() time base of the run.
+        self.t0 = t0
+
+    def append(self, r, i, deadline, value):
+        # Point i of repetition r, due at deadline, was just applied.
+        now = time.monotonic()
+        self.writer.append((r, i, deadline - self.t0, now - self.t0, value))
+        if not self.writer.pending():
+            # Written as a full block
+            self.oldest = None
+        elif self.oldest is None:
+            self.oldest = now
+        self.tick(now)
+
+    def tick(self, now):
+        # Write the rows in memory once the oldest is block_age old. Called
+        # while the run waits for the next point too, so that a slow profile
+        # does not keep its last points in memory until then.
+        if self.oldest is not None and now - self.oldest >= self.block_age:
+            self.flush()
+
+    def flush(self):
+        if self.writer is not None:
+            self.writer.flush()
+        self.oldest = None
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+
+def read(path):
+    # Read a journal. Returns its header as a dict, a dict with an
+    # array('d') per column and the length of the complete part of the file.
+    with open(path, 'rb') as f:
+        data = f.read()
+    if len(data) < HEADER.size:
+        raise ValueError('{} is not a journal'.format(path))
+    magic, version, current_mode, n, period, start = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError('{} is not a journal'.format(path))
+    header = {"current_mode": bool(current_mode), "points": n,
+              "period": period, "start": start}
+    columns, end = read_blocks(data, HEADER.size, COLUMNS)
+    return header, columns, end
+
+
+def last_point(columns):
+    # The last point recorded in the columns of a journal, as (repetition,
+    # index, scheduled time, value), or None if there is none.
+    if not columns['index']:
+        return None
+    return (int(columns['repetition'][-1]), int(columns['index'][-1]),
+            columns['scheduled'][-1], columns['value'][-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Summarise or export a journal.")
+    parser.add_argument("path", help="journal file")
+    parser.add_argument("--csv", metavar="FILE",
+                        help="export the points as CSV")
+    args = parser.parse_args(argv)
+    header, columns, _ = read(args.path)
+    n = len(columns['index'])
+    print("{} points applied since {}, {} per repetition of {:g} s".format(
+        n, time.strftime('%Y-%m-%d %H:%M:%S',
+                         time.localtime(header["start"])),
+        header["points"], header["period"]))
+    if n:
+        r, i, scheduled, value = last_point(columns)
+        print("Last: point {} of repetition {}, {:g} at {:.3f} s".format(
+            i + 1, r + 1, value, scheduled))
+    if args.csv:
+        with open(args.csv, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(COLUMNS)
+            writer.writerows(zip(*(columns[name] for name in COLUMNS)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import queue
+import threading
+import time
+
+from .engine import DONE, ERROR
+from .runlog import RunLog
+
+# Kind of the event with the timing report of a multi-channel run. Its
+# payload is the dict returned by MultiEngine.skew_report().
+SKEW = 'skew'
+
+# Time between the moment every channel is ready and the common start, so
+# that all I/O threads are already waiting for their first deadline.
+START_DELAY = 0.2
+
+
+class MultiEngine:
+    # Plays several PlaybackEngine channels at once, one I/O thread per
+    # serial port, against a shared start time on the monotonic clock.
+    # Every channel finishes its setup and waits for the others; then they
+    # all take the same t0 as the time base of their deadlines. The
+    # channels write to one runlog and their progress events are merged into
+    # one events queue, followed by a SKEW report and a single DONE or ERROR.
+
+    def __init__(self, channels, runlog=None):
+        self.channels = channels
+        self.events = queue.Queue()
+        self.runlog = runlog if runlog is not None else RunLog()
+        self.barrier = threading.Barrier(len(channels), action=self.set_t0)
+        self.t0 = None
+        self.stopped = False
+        self.errors = []
+        self.thread = None
+        for c in channels:
+            if c.name is None:
+                c.name = c.config["port"]
+            c.events = self.events
+            c.runlog = self.runlog
+            c.sync = self.sync
+
+    def set_t0(self):
+        self.t0 = time.monotonic() + START_DELAY
+
+    def sync(self):
+        try:
+            self.barrier.wait()
+        except threading.BrokenBarrierError:
+            if self.stopped:
+                return None
+            raise
+        return self.t0
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopped = True
+        for c in self.channels:
+            c.stop()
+        self.barrier.abort()
+
+    def join(self, timeout=None):
+        self.thread.join(timeout)
+
+    def running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def run_channel(self, channel):
+        try:
+            channel.execute()
+        except Exception as e:
+            # Don't leave the other channels waiting for this one
+            self.errors.append(e)
+            self.barrier.abort()
+
+    def run(self):
+        threads = [threading.Thread(target=self.run_channel, args=(c,),
+                                    daemon=True)
+                   for c in self.channels]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        if self.errors:
+            self.events.put((ERROR, self.errors[0]))
+        else:
+            self.events.put((SKEW, self.skew_report()))
+            self.events.put((DONE, not self.stopped))
+
+    def skew_report(self):
+        # Lateness of each channel with respect to the shared deadlines, for
+        # the last repetition, and the spread between channels (the skew).
+        report = {"channels": {}}
+        firsts = []
+        means = []
+        for c in self.channels:
+            sched = c.supply.scheduler if c.supply is not None else None
+            if sched is None or sched.count == 0:
+                continue
+            report["channels"][c.name] = {"first_late": sched.first_late,
+                                          "mean_late": sched.mean_late(),
+                                          "max_late": sched.max_late,
+                                          "skipped": sched.skipped}
+            firsts.append(sched.first_late)
+            means.append(sched.mean_late())
+        if firsts:
+            report["start_skew"] = max(firsts) - min(firsts)
+            report["mean_skew"] = max(means) - min(means)
+        return report
+
+
+def format_skew(report):
+    lines = []
+    for name, r in report["channels"].items():
+        lines.append("{}: first {:.3f} ms, mean {:.3f} ms, max {:.3f} ms late, "
+                     "{} skipped".format(name, r["first_late"]*1000,
+                                         r["mean_late"]*1000,
+                                         r["max_late"]*1000, r["skipped"]))
+    if "start_skew" in report:
+        lines.append("Skew between channels: {:.3f} ms at start, {:.3f} ms "
+                     "on average".format(report["start_skew"]*1000,
+                                         report["mean_skew"]*1000))
+    return "\n".join(lines)
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import mmap
+import re
+from array import array
+
+# NumPy is imported on first use (see get_numpy), False until then
+np = False
+
+# Bytes read from the CSV file at a time
+CHUNK_SIZE = 1 << 20
+
+
+class ProfileError(ValueError):
+    # A malformed profile file. lineno is the 1-based line at fault.
+
+    def __init__(self, lineno, message):
+        ValueError.__init__(self, 'line {}: {}'.format(lineno, message))
+        self.lineno = lineno
+
+
+def read_chunks(f, use_mmap=False):
+    if use_mmap:
+        try:
+            m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError: # empty file
+            return
+        with m:
+            for i in range(0, len(m), CHUNK_SIZE):
+                yield m[i:i+CHUNK_SIZE]
+    else:
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                return
+            yield chunk
+
+
+def load_csv(path, use_mmap=False):
+    # Read a two column CSV file (time, value) and return ts, vs as arrays
+    # of doubles. The file is parsed a chunk at a time (optionally through
+    # mmap), so memory use is the 16 bytes per row of the result. Raises
+    # ProfileError for rows without exactly two numbers or times that go
+    # backwards. Blank lines are ignored.
+    ts = array('d')
+    vs = array('d')
+    lineno = 0
+    last = float('-inf')
+    rest = b''
+    with open(path, 'rb') as f:
+        for chunk in read_chunks(f, use_mmap):
+            lines = (rest + chunk).split(b'\n')
+            rest = lines.pop()
+            for line in lines:
+                lineno += 1
+                last = parse_row(line, lineno, last, ts, vs)
+        if rest:
+            parse_row(rest, lineno + 1, last, ts, vs)
+    return ts, vs
+
+
+def parse_row(line, lineno, last, ts, vs):
+    # Append the row in line to ts, vs and return its time.
+    if not line.strip():
+        return last
+    fields = line.split(b',')
+    if len(fields) != 2:
+        raise ProfileError(lineno, 'expected 2 columns, found {}'
+                           .format(len(fields)))
+    try:
+        t = float(fields[0])
+        v = float(fields[1])
+    except ValueError:
+        raise ProfileError(lineno, 'not a number: {}'
+                           .format(line.strip().decode(errors='replace')))
+    if t < last:
+        raise ProfileError(lineno, 'time {} is before the previous {}'
+                           .format(t, last))
+    ts.append(t)
+    vs.append(v)
+    return t
+
+
+def get_numpy():
+    # NumPy, or None if it isn't installed. It takes longer to import than
+    # the rest of the package, so it is only loaded when first needed.
+    global np
+    if np is False:
+        try:
+            import numpy
+        except ImportError:
+            numpy = None
+        np = numpy
+    return np
+
+
+def pwl_counts(tws, min_trans):
+    # Number of steps each ramp between breakpoints is divided into.
+    return [max(1, int((tws[i] - tws[i-1])/min_trans))
+            for i in range(1, len(tws))]
+
+
+def expand_pwl(tws, vws, min_trans):
+    # Turn the breakpoints of a piecewise linear profile into a series of
+    # steps no closer than min_trans seconds, ending with the last
+    # breakpoint. Each point is interpolated directly from its ramp's ends,
+    # so no rounding error builds up along long ramps. Returns NumPy arrays
+    # when NumPy is available and lists otherwise.
+    if len(tws) < 2:
+        return tws, vws
+    np = get_numpy()
+    if np is None:
+        ts = []
+        vs = []
+        for t, v in iter_pwl(tws, vws, min_trans):
+            ts.append(t)
+            vs.append(v)
+        return ts, vs
+    tws = np.asarray(tws, dtype=np.float64)
+    vws = np.asarray(vws, dtype=np.float64)
+    ns = np.maximum(1, (np.diff(tws)/min_trans).astype(int))
+    seg = np.repeat(np.arange(len(ns)), ns)
+    # Position of each point within its ramp, as a fraction of the ramp
+    k = np.arange(ns.sum()) - np.repeat(np.cumsum(ns) - ns, ns)
+    frac = k / ns[seg]
+    ts = np.append(tws[seg] + frac*np.diff(tws)[seg], tws[-1])
+    vs = np.append(vws[seg] + frac*np.diff(vws)[seg], vws[-1])
+    return ts, vs
+
+
+def iter_pwl(tws, vws, min_trans):
+    # Lazy version of expand_pwl: yields the (t, v) points one at a time.
+    for i, n in enumerate(pwl_counts(tws, min_trans), 1):
+        t0, t1 = tws[i-1], tws[i]
+        v0, v1 = vws[i-1], vws[i]
+        for k in range(n):
+            yield t0 + k/n*(t1 - t0), v0 + k/n*(v1 - v0)
+    if len(tws) > 0:
+        yield tws[-1], vws[-1]
+
+
+class PwlProfile:
+    # A ramp profile kept as its breakpoints. Iterating over it generates
+    # the ramp points on demand, so hours of fine ramps cost only the
+    # breakpoints in memory; expand() gives the whole series at once.
+
+    def __init__(self, tws, vws, min_trans):
+        self.tws = tws
+        self.vws = vws
+        self.min_trans = min_trans
+
+    def __iter__(self):
+        return iter_pwl(self.tws, self.vws, self.min_trans)
+
+    def __len__(self):
+        if len(self.tws) == 0:
+            return 0
+        return sum(pwl_counts(self.tws, self.min_trans)) + 1
+
+    def duration(self):
+        return self.tws[-1] - self.tws[0] if len(self.tws) else 0
+
+    def expand(self):
+        return expand_pwl(self.tws, self.vws, self.min_trans)
+
+
+def format_decimals(syntax):
+    # Number of decimals a command syntax such as 'PV {:06.3f}' sends, or
+    # None if it can't be told from the format string.
+    m = re.search(r'\{[^}]*\.(\d+)[fF]\}', syntax)
+    return int(m.group(1)) if m else None
+
+
+def compress_series(ts, vs, syntax):
+    # Merge consecutive points whose values would be sent as the same
+    # command with syntax, keeping the first point of each run, and round
+    # the values to the resolution of the command. The last point is kept
+    # too, so that a profile ending on a hold still lasts until its end
+    # (playback does not send it again). Returns ts, vs and the number of
+    # points saved.
+    decimals = format_decimals(syntax)
+    out_ts = array('d')
+    out_vs = array('d')
+    last = None
+    n = len(ts)
+    for k, (t, v) in enumerate(zip(ts, vs), 1):
+        c = syntax.format(v)
+        if c != last or k == n:
+            out_ts.append(t)
+            out_vs.append(v if decimals is None else round(v, decimals))
+            last = c
+    return out_ts, out_vs, n - len(out_ts)
+
+
+def load_profile(path, pwl=False, min_trans=None, lazy=False):
+    # Load a CSV profile, expanding it as ramps if pwl is True. With lazy
+    # the ramps are returned unexpanded as a PwlProfile.
+    ts, vs = load_csv(path)
+    if pwl and lazy:
+        return PwlProfile(ts, vs, min_trans)
+    if pwl:
+        ts, vs = expand_pwl(ts, vs, min_trans)
+    return ts, vs
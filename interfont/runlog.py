@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import collections
+import threading
+import time
+
+DEBUG = 10   # every command and reply
+INFO = 20    # progress of the run
+WARNING = 30
+ERROR = 40
+
+LEVEL_NAMES = {DEBUG: 'DEBUG', INFO: 'INFO', WARNING: 'WARNING',
+               ERROR: 'ERROR'}
+LEVELS = {name.lower(): level for level, name in LEVEL_NAMES.items()}
+
+# Lines kept for display until the next drain()
+CAPACITY = 1000
+
+
+class RunLog:
+    # Log of a run, cheap enough to write to from the playback loop. Lines
+    # go into a bounded ring buffer that the display empties in batches
+    # with drain(), at its own pace; if it falls behind, the oldest lines
+    # are lost (and counted). Optionally every line is also appended to a
+    # file, through a large write buffer.
+
+    def __init__(self, capacity=CAPACITY, level=DEBUG, path=None):
+        self.level = level
+        self.pending = collections.deque(maxlen=capacity)
+        self.written = 0
+        self.drained = 0
+        self.lock = threading.Lock()
+        self.file = None
+        if path is not None:
+            self.file = open(path, 'a', buffering=1 << 16)
+
+    def write(self, text, level=DEBUG):
+        if level < self.level:
+            return
+        t = time.time()
+        self.pending.append((t, level, text))
+        self.written += 1
+        if self.file is not None:
+            with self.lock:
+                self.file.write('{:.6f} {} {}\n'.format(t, LEVEL_NAMES[level],
+                                                        text))
+
+    def debug(self, text):
+        self.write(text, DEBUG)
+
+    def info(self, text):
+        self.write(text, INFO)
+
+    def warning(self, text):
+        self.write(text, WARNING)
+
+    def error(self, text):
+        self.write(text, ERROR)
+
+    def drain(self):
+        # Return the text of the lines written since the last call. A note
+        # takes the place of the lines that did not fit in the buffer.
+        return [text for level, text in self.drain_entries()]
+
+    def drain_entries(self):
+        # Like drain(), as (level, text) pairs.
+        written = self.written
+        entries = []
+        while True:
+            try:
+                entries.append(self.pending.popleft()[1:])
+            except IndexError:
+                break
+        # Approximate if lines are written meanwhile, it is only a note
+        lost = written - self.drained - len(entries)
+        self.drained += len(entries)
+        if lost > 0:
+            self.drained += lost
+            entries.insert(0, (WARNING,
+                               '... {} lines not shown'.format(lost)))
+        return entries
+
+    def close(self):
+        if self.file is not None:
+            with self.lock:
+                self.file.close()
+                self.file = None
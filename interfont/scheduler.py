@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import bisect
+import itertools
+import time
+
+# Below this much time left before a deadline we spin instead of sleeping,
+# since time.sleep() can oversleep by around a millisecond.
+SPIN_TIME = 0.0005
+# Longest single sleep, so that a stop request is noticed quickly.
+POLL_TIME = 0.05
+
+LATE_POLICIES = ('skip', 'catchup')
+
+
+def wait_until(deadline, should_stop=None, spin=SPIN_TIME, idle=None):
+    # Block until time.monotonic() reaches deadline. Sleeps for most of the
+    # wait and only busy-waits for the last sub-millisecond. Returns False if
+    # should_stop() became true before the deadline. idle(deadline), if
+    # given, is called before each sleep and must return quickly.
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= spin:
+            break
+        if should_stop is not None and should_stop():
+            return False
+        if idle is not None:
+            idle(deadline)
+            remaining = deadline - time.monotonic()
+            if remaining <= spin:
+                break
+        time.sleep(min(remaining - spin, POLL_TIME))
+    while time.monotonic() < deadline:
+        pass
+    return True
+
+
+class Scheduler:
+    # Returns the points of a profile at their absolute deadlines t0 + t on
+    # the monotonic clock. t0 is the time of the first call to series() or
+    # stream() unless given.
+    #
+    # When a deadline has been missed the late policy decides what happens:
+    #   'skip'    jump to the latest point whose deadline has already passed,
+    #             so the output is never behind the profile (default).
+    #   'catchup' return every missed point straight away, in order.
+    #
+    # idle, if given, is called with the next deadline while waiting for it
+    # (see wait_until), e.g. to send other commands when there is time.
+
+    def __init__(self, t0=None, late_policy='skip', should_stop=None,
+                 spin=SPIN_TIME, idle=None):
+        if late_policy not in LATE_POLICIES:
+            raise ValueError('Unknown late policy: {}'.format(late_policy))
+        self.t0 = t0
+        self.late_policy = late_policy
+        self.should_stop = should_stop
+        self.spin = spin
+        self.idle = idle
+        self.skipped = 0
+        self.late = 0
+        # Lateness of the points returned so far, in seconds
+        self.count = 0
+        self.first_late = None
+        self.max_late = 0
+        self.total_late = 0
+        # Deadline of the last point returned
+        self.deadline = None
+
+    def start(self):
+        if self.t0 is None:
+            self.t0 = time.monotonic()
+
+    def wait(self, t):
+        # Wait for the deadline of time t. Returns the current time, or None
+        # if a stop was requested meanwhile.
+        deadline = self.deadline = self.t0 + t
+        if not wait_until(deadline, self.should_stop, self.spin,
+                          self.idle):
+            return None
+        now = time.monotonic()
+        late = now - deadline
+        if late > self.spin:
+            self.late += 1
+        if self.first_late is None:
+            self.first_late = late
+        self.count += 1
+        self.total_late += late
+        if late > self.max_late:
+            self.max_late = late
+        return now
+
+    def mean_late(self):
+        return self.total_late/self.count if self.count else 0
+
+    def series(self, ts, start=0):
+        # Yield the indexes of the time series ts from start on, each at its
+        # deadline.
+        self.start()
+        n = len(ts)
+        i = start
+        while i < n:
+            now = self.wait(ts[i])
+            if now is None:
+                return
+            if self.late_policy == 'skip' and i < n - 1 \
+               and now >= self.t0 + ts[i+1]:
+                # Several deadlines went by, keep only the most recent one.
+                j = bisect.bisect_right(ts, now - self.t0, i, n) - 1
+                self.skipped += j - i
+                i = j
+            yield i
+            i += 1
+
+    def stream(self, points, start=0):
+        # Yield (i, t, v) for the i-th (t, v) pair of an iterable, at its
+        # deadline, from the start-th on. Points are only pulled from the
+        # iterable when they are needed, so it can be a generator that
+        # computes them on the fly.
+        self.start()
+        it = itertools.islice(points, start, None)
+        point = next(it, None)
+        i = start
+        while point is not None:
+            now = self.wait(point[0])
+            if now is None:
+                return
+            following = next(it, None)
+            if self.late_policy == 'skip':
+                while following is not None and now >= self.t0 + following[0]:
+                    point = following
+                    following = next(it, None)
+                    self.skipped += 1
+                    i += 1
+            yield i, point[0], point[1]
+            point = following
+            i += 1
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Connections to the supplies kept open from one run to the next, so that a
+# new run neither reopens the port nor repeats setup commands the supply
+# has already applied (see Supply.state). Pass a SessionManager to each
+# PlaybackEngine and close it when done:
+#
+#   sessions = SessionManager()
+#   e = PlaybackEngine(config, ts, vs, sessions=sessions)
+#   ...
+#   sessions.close()
+
+import threading
+
+from .engine import make_supply, open_serial
+
+# Config fields that need a new Supply when they change. Those of the port
+# itself (port, baudrate) need a new session.
+SUPPLY_FIELDS = ("sleeptime", "timeout", "driver", "pvsyntax", "pcsyntax")
+PORT_FIELDS = ("port", "baudrate")
+
+
+def fields(config, names):
+    return tuple(config.get(name) for name in names)
+
+
+class Session:
+    # An open port and the Supply playing on it. Only one run can use a
+    # session at a time.
+
+    def __init__(self, config):
+        self.settings = fields(config, PORT_FIELDS)
+        self.serial = open_serial(config)
+        self.supply = None
+        self.supply_settings = None
+        self.runs = 0
+
+    def usable(self):
+        return self.serial.is_open and (
+            self.supply is None or self.supply.transport is None
+            or self.supply.transport.error is None)
+
+    def get_supply(self, config, output, verbose=False):
+        # The session's Supply, set up for a new run with config. The known
+        # state of the device is kept unless the supply has to be rebuilt.
+        settings = fields(config, SUPPLY_FIELDS)
+        s = self.supply
+        if s is None or settings != self.supply_settings:
+            state = s.state if s is not None else {}
+            if s is not None and s.transport is not None:
+                s.transport.close()
+            s = self.supply = make_supply(config, self.serial, output, verbose)
+            s.state = state
+            self.supply_settings = settings
+        s.output = output
+        s.verbose = verbose
+        s.setup_comms = config["setup_comms"]
+        s.stop = False
+        s.progress = None
+        s.telemetry = None
+        self.runs += 1
+        return s
+
+    def close(self):
+        if self.supply is not None:
+            self.supply.close()
+        else:
+            self.serial.close()
+
+
+class SessionManager:
+    # One Session per port, opened on first use and reopened when its port
+    # settings change or it failed.
+
+    def __init__(self):
+        self.sessions = {}
+        self.lock = threading.Lock()
+
+    def get(self, config):
+        port = config["port"]
+        with self.lock:
+            session = self.sessions.get(port)
+            if session is not None and (
+                    not session.usable()
+                    or session.settings != fields(config, PORT_FIELDS)):
+                del self.sessions[port]
+                session.close()
+                session = None
+            if session is None:
+                session = self.sessions[port] = Session(config)
+            return session
+
+    def discard(self, port):
+        # Close the session of a port, e.g. after an error or before
+        # another program uses the port.
+        with self.lock:
+            session = self.sessions.pop(port, None)
+        if session is not None:
+            session.close()
+
+    def close(self):
+        with self.lock:
+            sessions = list(self.sessions.values())
+            self.sessions.clear()
+        for session in sessions:
+            session.close()
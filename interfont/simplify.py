@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Reduces a densely sampled profile to the fewest points that stay within a
+# tolerance of it and are no closer than the supply's command interval, so
+# that what is played is decided beforehand rather than by which points the
+# scheduler happens to skip. Two shapes are available:
+#
+#   steps  a value held until the next point, chosen greedily: each step
+#          takes as many following samples as fit in a band of
+#          2*tolerance, and is set to the middle of the band.
+#   ramps  breakpoints found with Ramer-Douglas-Peucker on the vertical
+#          distance, played as ramps of steps min_interval apart
+#          (see profiles.expand_pwl).
+#
+# A step never lasts less than min_interval, even if that takes it out of
+# the tolerance, so the deviation returned is measured on the result and
+# can be larger than the tolerance asked for.
+
+from array import array
+
+from .profiles import expand_pwl, get_numpy
+
+SHAPES = ('steps', 'ramps')
+
+# Slack in comparisons with min_interval, for times read from a CSV file
+EPSILON = 1e-9
+
+
+def simplify_steps(ts, vs, tolerance, min_interval=0):
+    out_ts = array('d')
+    out_vs = array('d')
+    n = len(ts)
+    i = 0
+    while i < n:
+        lo = hi = vs[i]
+        j = i + 1
+        while j < n:
+            v = vs[j]
+            if ts[j] - ts[i] >= min_interval - EPSILON \
+               and max(hi, v) - min(lo, v) > 2*tolerance:
+                break
+            lo = min(lo, v)
+            hi = max(hi, v)
+            j += 1
+        out_ts.append(ts[i])
+        out_vs.append((lo + hi)/2)
+        i = j
+    if n and out_ts[-1] != ts[-1]:
+        # The last step lasts until the end of the profile
+        out_ts.append(ts[-1])
+        out_vs.append(out_vs[-1])
+    return out_ts, out_vs
+
+
+def farthest(ts, vs, i, j):
+    # Index between i and j furthest (vertically) from the line from point i
+    # to point j, and its distance.
+    span = ts[j] - ts[i]
+    slope = (vs[j] - vs[i])/span if span else 0
+    np = get_numpy()
+    if np is not None:
+        d = np.abs(vs[i+1:j] - vs[i] - (ts[i+1:j] - ts[i])*slope)
+        k = int(np.argmax(d))
+        return i + 1 + k, d[k]
+    best, worst = i, -1
+    for k in range(i + 1, j):
+        d = abs(vs[k] - vs[i] - (ts[k] - ts[i])*slope)
+        if d > worst:
+            best, worst = k, d
+    return best, worst
+
+
+def rdp(ts, vs, tolerance):
+    # Indexes of the Ramer-Douglas-Peucker breakpoints of ts, vs.
+    n = len(ts)
+    if n < 3:
+        return list(range(n))
+    np = get_numpy()
+    if np is not None:
+        ts = np.asarray(ts, dtype=np.float64)
+        vs = np.asarray(vs, dtype=np.float64)
+    keep = bytearray(n)
+    keep[0] = keep[-1] = 1
+    stack = [(0, n - 1)]
+    while stack:
+        i, j = stack.pop()
+        if j - i < 2:
+            continue
+        k, d = farthest(ts, vs, i, j)
+        if d > tolerance:
+            keep[k] = 1
+            stack.append((i, k))
+            stack.append((k, j))
+    return [i for i in range(n) if keep[i]]
+
+
+def simplify_ramps(ts, vs, tolerance, min_interval):
+    # A breakpoint closer than min_interval to the previous one is an edge
+    # too quick to play. The edge is kept where it is by moving the previous
+    # breakpoint back to min_interval before it, or when there is no room
+    # for that, the breakpoint is moved forward to min_interval after the
+    # previous one.
+    bts = array('d')
+    bvs = array('d')
+    for i in rdp(ts, vs, tolerance):
+        t = ts[i]
+        if len(bts) and t - bts[-1] < min_interval - EPSILON:
+            if len(bts) > 1 \
+               and t - min_interval - bts[-2] >= min_interval - EPSILON:
+                bts[-1] = t - min_interval
+            else:
+                t = bts[-1] + min_interval
+        bts.append(t)
+        bvs.append(vs[i])
+    return expand_pwl(bts, bvs, min_interval) if min_interval else (bts, bvs)
+
+
+def worst(a_ts, a_vs, b_ts, b_vs):
+    # Largest difference between step series a and b at the times of a.
+    # After its last point b has ended, and counts as 0 (where playback
+    # leaves the supply).
+    end = b_ts[-1]
+    np = get_numpy()
+    if np is not None:
+        a_ts = np.asarray(a_ts, dtype=np.float64)
+        idx = np.searchsorted(np.asarray(b_ts), a_ts, 'right') - 1
+        b = np.asarray(b_vs, dtype=np.float64)[np.maximum(idx, 0)]
+        b[a_ts > end] = 0.0
+        d = np.abs(np.asarray(a_vs, dtype=np.float64) - b)
+        return float(d.max()) if len(d) else 0.0
+    d = 0.0
+    j = 0
+    for t, v in zip(a_ts, a_vs):
+        while j + 1 < len(b_ts) and b_ts[j+1] <= t:
+            j += 1
+        d = max(d, abs(v - (b_vs[j] if t <= end else 0.0)))
+    return d
+
+
+def step_deviation(ts, vs, out_ts, out_vs):
+    # Largest difference between two step series. Both are constant
+    # between their points, so it is found at the points of one of them;
+    # a series that ends first is taken to drop to 0 there.
+    if not len(ts) or not len(out_ts):
+        return 0.0
+    return max(worst(ts, vs, out_ts, out_vs), worst(out_ts, out_vs, ts, vs))
+
+
+def simplify(ts, vs, tolerance, min_interval=0, shape='steps'):
+    # Returns the series to play and its largest deviation from ts, vs.
+    if shape not in SHAPES:
+        raise ValueError('Unknown simplification: {}'.format(shape))
+    if shape == 'steps':
+        out_ts, out_vs = simplify_steps(ts, vs, tolerance, min_interval)
+    else:
+        out_ts, out_vs = simplify_ramps(ts, vs, tolerance, min_interval)
+    return out_ts, out_vs, step_deviation(ts, vs, out_ts, out_vs)
@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# A simulated Lambda GEN/Z power supply behind a pseudo terminal, to try
+# and benchmark the program without hardware. Run it on its own with
+#
+#   python3 -m interfont.simulator --latency 5 --jitter 1
+#
+# and use the port it prints in the supply configuration.
+
+import argparse
+import os
+import random
+import threading
+import time
+import tty
+
+
+class SupplyState:
+    # Settings of one simulated supply
+
+    def __init__(self, load=1.0):
+        self.remote = 0
+        self.output = 0
+        self.pv = 0.0
+        self.pc = 0.0
+        self.load = load # ohms
+        # List memory (see SimulatedSupply.lists)
+        self.lists = {'VOLT': [], 'CURR': [], 'DWEL': []}
+        self.count = 1
+        self.mode = None # 'VOLT' or 'CURR' while in list mode
+        self.armed = False
+        self.running = None # threading.Event set to stop the running list
+
+    def measured(self):
+        # Output voltage and current into a resistive load, limited by the
+        # programmed current.
+        if not self.output:
+            return 0.0, 0.0
+        c = min(self.pc, self.pv/self.load)
+        return c*self.load, c
+
+
+class SimulatedSupply:
+    # Answers the Lambda GEN/Z commands ADR, RMT, OUT, PV, PC, IDN?, PV?,
+    # PC?, MV? and MC? on a pty. Every command waits `latency` seconds plus a
+    # random jitter of up to `jitter` before its reply, and is ignored (not
+    # applied, not answered) with probability `drop`. Several supplies can
+    # share the line, one per address, as on a RS-485 daisy chain.
+    #
+    # With lists, the supply also has list memory like a Z+ (see
+    # drivers.ZPlusDriver): LIST:VOLT, LIST:CURR, LIST:DWEL, LIST:COUN,
+    # LIST:STEP, TRIG:SOUR, VOLT:MODE, CURR:MODE, INIT, *TRG and ABOR. A
+    # triggered list plays on a thread of its own, and its points go to the
+    # log like any other setpoint.
+
+    def __init__(self, latency=0.0, jitter=0.0, drop=0.0, addresses=(0,),
+                 model='GEN16-150', load=1.0, seed=None, lists=False):
+        self.latency = latency
+        self.jitter = jitter
+        self.drop = drop
+        self.model = model
+        self.lists = lists
+        self.supplies = {a: SupplyState(load) for a in addresses}
+        self.address = None
+        self.random = random.Random(seed)
+        self.received = 0
+        self.dropped = 0
+        self.errors = 0
+        self.log = [] # (time, address, command) of every applied setpoint
+        self.master, slave = os.openpty()
+        tty.setraw(slave)
+        self.port = os.ttyname(slave)
+        self.slave = slave
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def close(self):
+        os.close(self.master)
+        os.close(self.slave)
+
+    def stats(self):
+        return {"received": self.received, "dropped": self.dropped,
+                "errors": self.errors}
+
+    def run(self):
+        buffer = b''
+        while True:
+            try:
+                data = os.read(self.master, 4096)
+            except OSError:
+                return
+            if not data:
+                return
+            buffer += data
+            while b'\r' in buffer:
+                line, buffer = buffer.split(b'\r', 1)
+                line = line.strip().decode(errors='replace')
+                if line:
+                    self.command(line)
+
+    def command(self, line):
+        self.received += 1
+        if self.drop and self.random.random() < self.drop:
+            self.dropped += 1
+            return
+        reply = self.handle(line)
+        if reply is None:
+            return
+        delay = self.latency
+        if self.jitter:
+            delay += self.random.uniform(0, self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+        try:
+            os.write(self.master, (reply + '\r').encode())
+        except OSError:
+            pass
+
+    def handle(self, line):
+        # Apply a command and return the reply, or None for no reply.
+        name, _, arg = line.partition(' ')
+        name = name.upper()
+        if name == 'ADR':
+            try:
+                address = int(arg)
+            except ValueError:
+                return self.error()
+            if address not in self.supplies:
+                # Nobody on the line answers to that address
+                self.address = None
+                return None
+            self.address = address
+            return 'OK'
+        if self.address is None:
+            return None
+        s = self.supplies[self.address]
+        try:
+            if name == 'RMT':
+                s.remote = int(arg) if arg.isdigit() else {'LOC': 0, 'REM': 1,
+                                                           'LLO': 2}[arg]
+            elif name == 'OUT':
+                s.output = 1 if arg in ('1', 'ON') else 0
+            elif name == 'PV':
+                s.pv = float(arg)
+                self.log.append((time.monotonic(), self.address, line))
+            elif name == 'PC':
+                s.pc = float(arg)
+                self.log.append((time.monotonic(), self.address, line))
+            elif name == 'IDN?':
+                return 'LAMBDA,{}'.format(self.model)
+            elif name == 'PV?':
+                return '{:.3f}'.format(s.pv)
+            elif name == 'PC?':
+                return '{:.3f}'.format(s.pc)
+            elif name == 'MV?':
+                return '{:.3f}'.format(s.measured()[0])
+            elif name == 'MC?':
+                return '{:.3f}'.format(s.measured()[1])
+            elif self.lists:
+                return self.list_command(s, name, arg)
+            else:
+                return self.error()
+        except (ValueError, KeyError):
+            return self.error()
+        return 'OK'
+
+    def list_command(self, s, name, arg):
+        # A command of the list subsystem for supply s.
+        if name in ('LIST:VOLT', 'LIST:CURR', 'LIST:DWEL'):
+            s.lists[name[5:]] = [float(x) for x in arg.split(',')]
+        elif name == 'LIST:COUN':
+            s.count = int(arg)
+        elif name in ('LIST:STEP', 'TRIG:SOUR'):
+            pass # only AUTO and BUS are simulated
+        elif name in ('VOLT:MODE', 'CURR:MODE'):
+            s.mode = name[:4] if arg.upper() == 'LIST' else None
+        elif name == 'INIT':
+            s.armed = s.mode is not None
+        elif name == '*TRG':
+            if not s.armed or len(s.lists[s.mode]) != len(s.lists['DWEL']):
+                return self.error()
+            s.armed = False
+            s.running = threading.Event()
+            threading.Thread(target=self.play_list,
+                             args=(s, self.address, s.running),
+                             daemon=True).start()
+        elif name == 'ABOR':
+            if s.running is not None:
+                s.running.set()
+            s.armed = False
+        else:
+            return self.error()
+        return 'OK'
+
+    def play_list(self, s, address, stopped):
+        # Apply the points of the list at their times, count times over.
+        key = 'PV' if s.mode == 'VOLT' else 'PC'
+        values = s.lists[s.mode]
+        t = time.monotonic()
+        for _ in range(s.count):
+            for v, dwell in zip(values, s.lists['DWEL']):
+                if stopped.is_set():
+                    return
+                if key == 'PV':
+                    s.pv = v
+                else:
+                    s.pc = v
+                self.log.append((time.monotonic(), address,
+                                 '{} {}'.format(key, v)))
+                t += dwell
+                if stopped.wait(max(0, t - time.monotonic())):
+                    return
+
+    def error(self):
+        self.errors += 1
+        return 'E01'
+
+
+def serve(conn, **kwargs):
+    # Run a simulator in a child process (see bench.py): send its port
+    # through conn, wait for any message, then send back its stats.
+    sim = SimulatedSupply(**kwargs).start()
+    conn.send(sim.port)
+    conn.recv()
+    conn.send(sim.stats())
+    sim.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Simulated Lambda GEN/Z supply on a pseudo terminal.")
+    parser.add_argument("--latency", type=float, default=2,
+                        help="reply latency in ms (default 2)")
+    parser.add_argument("--jitter", type=float, default=0,
+                        help="maximum random extra latency in ms")
+    parser.add_argument("--drop", type=float, default=0,
+                        help="probability of ignoring a command")
+    parser.add_argument("--lists", action="store_true",
+                        help="simulate list memory, as on a Z+")
+    parser.add_argument("--address", type=int, action="append",
+                        help="address answered to (can be repeated, "
+                             "default 0)")
+    args = parser.parse_args(argv)
+    sim = SimulatedSupply(latency=args.latency/1000,
+                          jitter=args.jitter/1000,
+                          drop=args.drop,
+                          addresses=args.address or (0,),
+                          lists=args.lists).start()
+    print(sim.port)
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        print(sim.stats())
+        sim.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import time
+
+from .scheduler import Scheduler
+from .timing import NAN, Timing
+from .transport import Transport
+
+# Each reply latency counts for a little less than the one before it in the
+# estimate of Supply.latency, and telemetry queries are only sent with
+# QUERY_MARGIN times the estimated time to answer them left
+LATENCY_DECAY = 0.99
+QUERY_MARGIN = 1.5
+
+# Most points of a lazy profile whose timing is recorded: the record takes
+# 25 bytes a point, allocated up front (see timing.Timing)
+TIMED_POINTS = 1 << 20
+
+
+class Supply:
+    
+    def __init__(self, serial, sleep_time, pvsyntax, pcsyntax, output,
+                 verbose = True, setup_comms=[], late_policy='skip',
+                 ack_timeout=None, instrument=True):
+        self.sleep_time = sleep_time 
+        self.late_policy = late_policy
+        self.sleep = True
+        self.verbose = verbose
+        self.setup_comms =setup_comms
+        self.pvsyntax = pvsyntax
+        self.pcsyntax = pcsyntax
+        self.output = output
+        self.current_mode = False
+        self.serial = serial
+        self.stop = False
+        # Called with the index and time of each applied point
+        self.progress = None
+        # Called with the next deadline while a run waits for it (see idle)
+        self.waiting = None
+        self.scheduler = None # scheduler of the last run
+        # With instrument, each run records a timing.Timing of its points
+        self.instrument = instrument
+        self.timing = None
+        self.index = None # index of the point being applied
+        self.v = 0
+        self.c = 0
+        self.setpoint = 0 # value of the point being applied
+        # With a telemetry.Telemetry, measurements are queried between
+        # setpoints while a run plays (needs the transport).
+        self.telemetry = None
+        # Recent peak of the reply latency, slowly decaying, which decides
+        # whether there is room for a sample before the next setpoint
+        self.latency = None
+        # Known state of the device: the argument of the last command of
+        # each name (e.g. {'OUT': '1', 'PV': '05.000'}). Commands whose
+        # effect is uncertain, unanswered or refused, are forgotten.
+        self.state = {}
+        # With an ack timeout commands go through an asynchronous transport
+        # that waits for each reply (or the timeout) instead of sleep_time.
+        self.transport = None
+        if ack_timeout is not None:
+            self.transport = Transport(serial, timeout=ack_timeout,
+                                       on_reply=self.reply)
+ 
+    def setup(self):
+        # Send the setup commands, except those that wouldn't change the
+        # known state of the device (see session.py).
+        for c in self.setup_comms:
+            name, _, arg = c.partition(' ')
+            if self.state.get(name) != arg:
+                self.write_command(c)
+        if self.transport is not None:
+            self.transport.flush()
+        
+    def release(self):
+        # End a run leaving the port open for the next one: wait for the
+        # last replies and close the telemetry.
+        if self.transport is not None:
+            self.transport.flush()
+        if self.telemetry is not None:
+            self.telemetry.close()
+        
+    def close(self):
+        if self.transport is not None:
+            self.transport.close()
+        if self.telemetry is not None:
+            self.telemetry.close()
+        self.serial.close()
+        
+    def write_command(self, c, key=None):
+        # Adds an EOL to a command, encodes it and sends it to the serial device.
+        # c can also be the bytes of a command already encoded, EOL included.
+        # Make sure to wait at least 50 ms before issuing another command.
+        if isinstance(c, bytes):
+            comm = c
+            c = c.decode().rstrip('\r')
+        else:
+            comm = (c + '\r').encode()
+        if self.verbose:
+            print(c)
+        self.output(c)
+        name, _, arg = c.partition(' ')
+        self.state[name] = arg
+        timing = self.timing if self.index is not None else None
+        if self.transport is not None:
+            # Queued setpoints with the same key are replaced by newer ones.
+            tag = None
+            if timing is not None:
+                timing.queued(self.index, time.monotonic())
+                tag = (timing, self.index)
+            replaced = self.transport.send(comm, key, tag)
+            if replaced is not None:
+                replaced[0].replaced(replaced[1])
+            return
+        if timing is not None:
+            timing.queued(self.index, time.monotonic())
+        self.serial.write(comm)
+        if self.sleep:
+            time.sleep(self.sleep_time)
+        resp = self.read_buffer().rstrip("\n").rstrip("\r")  # sobra un rstrip?
+        if resp != '':
+            self.output(resp)
+        if self.verbose:
+            print(resp) 
+    
+    def reply(self, c, resp, t_sent, latency, tag):
+        # Called by the transport when command c is answered or times out.
+        if self.latency is None or latency > self.latency:
+            self.latency = latency
+        else:
+            self.latency *= LATENCY_DECAY
+        if resp is None or resp[:1] in ('E', 'C'): # Lambda error replies
+            name = c.decode(errors='replace').strip().partition(' ')[0]
+            self.state.pop(name, None)
+        if tag is not None:
+            record, i = tag
+            if record is self.telemetry:
+                record.measured(i, resp)
+                return
+            record.replied(i, t_sent, latency if resp is not None else NAN)
+        if resp:
+            self.output(resp)
+            if self.verbose:
+                print(resp)
+    
+    def read_buffer(self):
+        # Read buffer and decode it.
+        resp = self.serial.read_all()
+        return resp.decode()
+    
+    def PV(self, V):
+        # Set the power source to a certain voltage. Nothing is sent if the
+        # command would be the same as the last one, e.g. for values that
+        # differ by less than the precision of pvsyntax.
+        c = self.pvsyntax.format(V)
+        if c != self.pvsyntax.format(self.v):
+            self.write_command(c, 'PV')
+            self.v = V
+    
+    def PC(self, C):
+        # Set the power source to a certain current.
+        c = self.pcsyntax.format(C)
+        if c != self.pcsyntax.format(self.c):
+            self.write_command(c, 'PC')
+            self.c = C
+    
+    def idle(self, deadline):
+        # Called by the scheduler while it waits for deadline.
+        self.measure(deadline)
+        if self.waiting is not None:
+            self.waiting(deadline)
+    
+    def measure(self, deadline):
+        # Called while the scheduler waits for deadline: send the telemetry
+        # queries if a sample is due, the line is free and, going by the
+        # recent reply latency, they will be answered before the deadline,
+        # so that measuring never delays a setpoint. Samples that find no
+        # such room within their interval are given up.
+        if self.transport is None or self.telemetry is None:
+            return
+        now = time.monotonic()
+        if not self.telemetry.due(now):
+            return
+        self.telemetry.give_up(now)
+        queries = self.telemetry.queries
+        latency = self.transport.timeout if self.latency is None \
+            else self.latency
+        if not self.transport.idle() \
+           or deadline - now < QUERY_MARGIN*len(queries)*latency:
+            return
+        self.telemetry.begin(now, self.setpoint)
+        for j, q in enumerate(queries):
+            self.transport.send(q, tag=(self.telemetry, j))
+    
+    def start_run(self, n, t0, start=0):
+        # Scheduler and, for n points from start on, timing record of a new
+        # run.
+        self.scheduler = Scheduler(t0, late_policy=self.late_policy,
+                                   should_stop=lambda: self.stop,
+                                   idle=self.idle)
+        self.timing = None
+        if self.instrument and n is not None:
+            self.timing = Timing(n, start)
+    
+    def reached(self, i, v):
+        self.index = i
+        self.setpoint = v
+        if self.timing is not None:
+            if self.timing.t0 is None:
+                self.timing.t0 = self.scheduler.t0
+            self.timing.reached(i, self.scheduler.deadline)
+    
+    def end_run(self):
+        self.index = None
+        self.sleep = True
+    
+    def runseries(self, ts, vs, current_mode = False, t0 = None, start = 0):
+        # Apply each value of vs at its time in ts, counted from the moment
+        # the series starts or from t0 (a time.monotonic() value) if given,
+        # beginning with point start (e.g. to resume a run).
+        # Deadlines are absolute on the monotonic clock so command overhead
+        # does not accumulate; missed points are handled according to
+        # self.late_policy (see scheduler.Scheduler).
+        if len(ts) == len(vs):
+            self.sleep = False
+            setpoint = self.PC if current_mode else self.PV
+            self.start_run(len(ts), t0, start)
+            for i in self.scheduler.series(ts, start):
+                if self.stop:
+                    break
+                self.reached(i, vs[i])
+                setpoint(vs[i])
+                if self.progress is not None:
+                    self.progress(i, ts[i])
+            self.end_run()
+        else:
+            print('## Error: Time and voltage series are not equally long. ##')
+    
+    def runpoints(self, points, current_mode = False, t0 = None, start = 0):
+        # Like runseries, but takes an iterable of (t, v) pairs that is only
+        # consumed as playback advances (e.g. profiles.PwlProfile). Without
+        # a length, or longer than TIMED_POINTS, there is no timing record.
+        self.sleep = False
+        setpoint = self.PC if current_mode else self.PV
+        try:
+            n = len(points)
+        except TypeError:
+            n = None
+        if n is not None and n > TIMED_POINTS:
+            n = None
+        self.start_run(n, t0, start)
+        for i, t, v in self.scheduler.stream(points, start):
+            if self.stop:
+                break
+            self.reached(i, v)
+            setpoint(v)
+            if self.progress is not None:
+                self.progress(i, t)
+        self.end_run()
+    
+    def runlist(self, profile, current_mode = False, t0 = None):
+        # Follow a compiled profile that the supply plays from its own list
+        # memory (see drivers.py): nothing is sent, but the progress, the
+        # telemetry and the known setpoint keep pace with it.
+        self.start_run(None, t0)
+        i = None
+        for i in self.scheduler.series(profile.times):
+            if self.stop:
+                break
+            self.reached(i, profile.values[i])
+            if self.progress is not None:
+                self.progress(i, profile.times[i])
+        if i is not None:
+            if current_mode:
+                self.c = profile.values[i]
+            else:
+                self.v = profile.values[i]
+        self.end_run()
+    
+    def runcompiled(self, profile, current_mode = False, t0 = None, start = 0):
+        # Play a compiler.CompiledProfile. Its commands are already encoded,
+        # so nothing is formatted during playback; a command is only skipped
+        # when it is identical to the previous one.
+        self.sleep = False
+        key = 'PC' if current_mode else 'PV'
+        last = None
+        self.start_run(len(profile), t0, start)
+        i = None
+        for i in self.scheduler.series(profile.times, start):
+            if self.stop:
+                break
+            self.reached(i, profile.values[i])
+            c = profile.command(i)
+            if c != last:
+                self.write_command(c, key)
+                last = c
+            if self.progress is not None:
+                self.progress(i, profile.times[i])
+        if i is not None:
+            if current_mode:
+                self.c = profile.values[i]
+            else:
+                self.v = profile.values[i]
+        self.end_run()
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Measurements of what the supply actually outputs while a profile plays.
+# Measurement queries (MV? and MC? by default, or the config's
+# "telemetry_queries") are slipped into the command stream between
+# setpoints, and each sample is appended to a file as it completes, so a
+# run of any length only keeps one block of samples in memory.
+#
+# File layout (little endian), append only:
+#   header   MAGIC, version, number of columns, start of the run (Unix time)
+#   blocks   of rows, see blockfile.py
+#
+# The columns are COLUMNS: the time of the sample from the start of the run
+# in seconds, the setpoint being applied, and the measured voltage and
+# current (NaN when a query went unanswered). A resumed run (see
+# journal.py) appends to the file of the run it resumes, on the same time
+# base. To look at a file:
+#
+#   python3 -m interfont.telemetry run.iftm --csv run.csv
+
+import argparse
+import csv
+import os
+import struct
+import sys
+import time
+
+from .blockfile import BlockWriter, read_blocks
+
+MAGIC = b'IFTM'
+VERSION = 1
+HEADER = struct.Struct('<4sIId')
+
+COLUMNS = ('time', 'setpoint', 'voltage', 'current')
+QUERIES = ('MV?', 'MC?')
+
+# Samples per second while playing (default)
+RATE = 10
+# Rows kept in memory before they are written as a block
+BLOCK_ROWS = 1024
+
+NAN = float('nan')
+
+
+class TelemetryWriter(BlockWriter):
+    # Appends rows of len(COLUMNS) values to a telemetry file, one block of
+    # up to block_rows rows at a time. With resume, an existing file is
+    # continued after its last complete block instead of replaced.
+
+    def __init__(self, path, start=None, block_rows=BLOCK_ROWS,
+                 resume=False):
+        self.path = path
+        if resume and os.path.exists(path):
+            _, _, end = read(path)
+            f = open(path, 'r+b')
+            f.truncate(end)
+            f.seek(end)
+        else:
+            f = open(path, 'wb')
+            f.write(HEADER.pack(MAGIC, VERSION, len(COLUMNS),
+                                time.time() if start is None else start))
+            f.flush()
+        super().__init__(f, len(COLUMNS), block_rows)
+
+
+class Telemetry:
+    # Sampling state of a run. The supply asks for a sample with due() and
+    # begin() from its playback thread and the replies come back through
+    # measured() from the transport's I/O thread. Only one sample is in
+    # flight at a time, and it becomes a row once all its queries have been
+    # answered or have timed out.
+
+    def __init__(self, path, rate=RATE, queries=QUERIES,
+                 block_rows=BLOCK_ROWS):
+        if len(queries) != len(COLUMNS) - 2:
+            raise ValueError('Expected {} telemetry queries, got {}'
+                             .format(len(COLUMNS) - 2, len(queries)))
+        self.path = path
+        self.interval = 1/rate
+        self.queries = [(q + '\r').encode() for q in queries]
+        self.block_rows = block_rows
+        self.writer = None
+        self.t0 = None
+        self.next = None # time the next sample is due
+        self.row = None # sample being measured
+        self.pending = 0
+        self.samples = 0
+        self.unanswered = 0
+        self.missed = 0 # samples given up for lack of room between setpoints
+        # Called with each row as it is completed, from the I/O thread
+        self.listener = None
+        # Called once, from the playback thread, when the first sample is
+        # given up: the rate cannot be met
+        self.on_missed = None
+
+    def start(self, t0, resume=False):
+        # t0 is the time.monotonic() start of the run, time 0 of the file,
+        # which is in the past when resuming: sampling starts now. With
+        # resume, the samples go on after those already in the file.
+        self.t0 = t0
+        self.next = max(t0, time.monotonic())
+        start = time.time() + (t0 - time.monotonic())
+        self.writer = TelemetryWriter(self.path, start, self.block_rows,
+                                      resume)
+
+    def due(self, now):
+        return self.writer is not None and self.row is None \
+            and now >= self.next
+
+    def give_up(self, now):
+        # Give up the due samples whose whole interval has passed without
+        # room to take them, rather than try to catch up later.
+        k = int((now - self.next)/self.interval)
+        if k <= 0:
+            return
+        if not self.missed and self.on_missed is not None:
+            self.on_missed()
+        self.missed += k
+        self.next += k*self.interval
+
+    def begin(self, now, setpoint):
+        self.give_up(now)
+        self.row = [now - self.t0, setpoint] + [NAN]*len(self.queries)
+        self.pending = len(self.queries)
+        self.next += self.interval
+
+    def measured(self, j, reply):
+        # Reply (None if it timed out) to query j of the current sample.
+        try:
+            self.row[2 + j] = float(reply)
+        except (TypeError, ValueError):
+            self.unanswered += 1
+        self.pending -= 1
+        if not self.pending:
+            self.writer.append(self.row)
+            if self.listener is not None:
+                self.listener(self.row)
+            self.samples += 1
+            self.row = None
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+def read(path):
+    # Read a telemetry file. Returns the start time of the run (Unix time),
+    # a dict with an array('d') per column and the length of the complete
+    # part of the file.
+    with open(path, 'rb') as f:
+        data = f.read()
+    if len(data) < HEADER.size:
+        raise ValueError('{} is not a telemetry file'.format(path))
+    magic, version, ncolumns, start = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION or ncolumns != len(COLUMNS):
+        raise ValueError('{} is not a telemetry file'.format(path))
+    columns, end = read_blocks(data, HEADER.size, COLUMNS)
+    return start, columns, end
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Summarise or export a telemetry file.")
+    parser.add_argument("path", help="telemetry file")
+    parser.add_argument("--csv", metavar="FILE",
+                        help="export the samples as CSV")
+    args = parser.parse_args(argv)
+    start, columns, _ = read(args.path)
+    n = len(columns['time'])
+    print("{} samples from {}".format(
+        n, time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(start))))
+    if n:
+        print("{:.3f} s to {:.3f} s".format(columns['time'][0],
+                                            columns['time'][-1]))
+    if args.csv:
+        with open(args.csv, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(COLUMNS)
+            writer.writerows(zip(*(columns[name] for name in COLUMNS)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import csv
+import json
+import math
+from array import array
+
+# Status of each point of a run
+NOT_REACHED = 0 # never returned by the scheduler: skipped, or after a stop
+UNCHANGED = 1   # reached, but its command was the same as the previous one
+SENT = 2        # its command was sent
+REPLACED = 3    # its command was replaced in the transport queue by a newer one
+
+STATUS_NAMES = {NOT_REACHED: 'not reached', UNCHANGED: 'unchanged',
+                SENT: 'sent', REPLACED: 'replaced'}
+
+NAN = float('nan')
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return NAN
+    k = min(len(sorted_values) - 1, int(round(p/100*(len(sorted_values) - 1))))
+    return sorted_values[k]
+
+
+class Timing:
+    # What happened to each of the n points of a run. The arrays are
+    # allocated up front and filled in by index, so recording costs a few
+    # stores per command. All times are time.monotonic() values.
+    #   scheduled  deadline of the point
+    #   sent       when its command was written to the port
+    #   latency    time from writing the command to its reply (NaN if none)
+    #   status     one of the constants above
+
+    def __init__(self, n, first=0):
+        self.n = n
+        # The run starts at point first (when resumed), earlier points are
+        # left out of the summary
+        self.first = first
+        self.scheduled = array('d', [NAN])*n
+        self.sent = array('d', [NAN])*n
+        self.latency = array('d', [NAN])*n
+        self.status = array('b', [NOT_REACHED])*n
+        self.t0 = None
+        self.last = -1 # last index reached
+
+    def reached(self, i, scheduled):
+        self.scheduled[i] = scheduled
+        self.status[i] = UNCHANGED
+        self.last = i
+
+    def queued(self, i, t):
+        self.sent[i] = t
+        self.status[i] = SENT
+
+    def replaced(self, i):
+        self.status[i] = REPLACED
+
+    def replied(self, i, t_sent, latency):
+        self.sent[i] = t_sent
+        self.latency[i] = latency
+
+    def summary(self):
+        lateness = []
+        latencies = []
+        counts = dict.fromkeys(STATUS_NAMES, 0)
+        for i in range(self.first, self.last + 1):
+            status = self.status[i]
+            counts[status] += 1
+            if status == SENT:
+                lateness.append(self.sent[i] - self.scheduled[i])
+                if not math.isnan(self.latency[i]):
+                    latencies.append(self.latency[i])
+        lateness.sort()
+        latencies.sort()
+        sent = counts[SENT]
+        duration = 0
+        if sent > 1:
+            times = [self.sent[i] for i in range(self.first, self.last + 1)
+                     if self.status[i] == SENT]
+            duration = max(times) - min(times)
+        return {"points": self.n,
+                "reached": max(0, self.last + 1 - self.first),
+                "sent": sent,
+                "unchanged": counts[UNCHANGED],
+                "skipped": counts[NOT_REACHED],
+                "replaced": counts[REPLACED],
+                "unanswered": sent - len(latencies),
+                "commands_per_second": (sent - 1)/duration if duration else NAN,
+                "lateness_p50": percentile(lateness, 50),
+                "lateness_p99": percentile(lateness, 99),
+                "lateness_max": lateness[-1] if lateness else NAN,
+                "latency_p50": percentile(latencies, 50),
+                "latency_p99": percentile(latencies, 99)}
+
+    def rows(self):
+        # (index, scheduled, sent, latency, status) for each point, with
+        # times relative to the start of the run.
+        t0 = self.t0 or 0
+        for i in range(self.n):
+            yield (i, self.scheduled[i] - t0, self.sent[i] - t0,
+                   self.latency[i], STATUS_NAMES[self.status[i]])
+
+    def export(self, path):
+        # Write the timing of every point, as JSON (with the summary) if
+        # path ends in .json and as CSV otherwise.
+        if path.endswith('.json'):
+            points = [dict(zip(('index', 'scheduled', 'sent', 'latency',
+                                'status'), r))
+                      for r in self.rows()]
+            with open(path, 'w') as f:
+                # NaN is not JSON, missing values become null
+                json.dump(replace_nan({"summary": self.summary(),
+                                       "points": points}), f)
+        else:
+            with open(path, 'w', newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(['index', 'scheduled', 'sent', 'latency',
+                                 'status'])
+                writer.writerows(self.rows())
+
+
+def replace_nan(x):
+    if isinstance(x, float) and math.isnan(x):
+        return None
+    if isinstance(x, dict):
+        return {k: replace_nan(v) for k, v in x.items()}
+    if isinstance(x, list):
+        return [replace_nan(v) for v in x]
+    return x
+
+
+def format_summary(s):
+    ms = lambda x: 'n/a' if math.isnan(x) else '{:.3f} ms'.format(x*1000)
+    return ("{} of {} points sent, {} unchanged, {} skipped, {} replaced, "
+            "{} unanswered; {:.1f} commands/s; lateness p50 {}, p99 {}, "
+            "max {}; reply latency p50 {}, p99 {}").format(
+                s["sent"], s["points"], s["unchanged"], s["skipped"],
+                s["replaced"], s["unanswered"], s["commands_per_second"],
+                ms(s["lateness_p50"]), ms(s["lateness_p99"]),
+                ms(s["lateness_max"]), ms(s["latency_p50"]),
+                ms(s["latency_p99"]))
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import collections
+import threading
+import time
+
+# Longest a read blocks before checking the reply timeout again.
+READ_POLL = 0.005
+
+
+class Transport:
+    # Sends commands to a serial device from an I/O thread and paces them by
+    # the device's replies instead of a fixed sleep.
+    #
+    # send() only queues the command and returns straight away. The I/O
+    # thread writes up to `window` commands ahead, matches each reply line
+    # (e.g. the Lambda "OK") to the oldest command in flight, and writes the
+    # next one as soon as a reply arrives or `timeout` seconds pass without
+    # one. Commands queued with a key replace any queued, not yet written
+    # command with the same key, so a slow device gets the latest setpoint
+    # rather than a growing backlog of stale ones.
+    #
+    # A reply that comes after its timeout would be taken for the reply to
+    # the next command, and every reply after it would be off by one. So
+    # after a timeout the next command waits up to another `timeout` for
+    # the late reply, which is dropped along with any other stale input.
+    #
+    # If the port fails (e.g. the adapter is unplugged) the I/O thread
+    # stops, the queued commands are dropped and the error is raised by the
+    # next send() or flush().
+
+    def __init__(self, serial, timeout=0.1, window=1, eol='\r',
+                 on_reply=None):
+        self.serial = serial
+        self.timeout = timeout
+        self.window = window
+        self.eol = eol.encode()
+        # on_reply(command, reply, t_sent, latency, tag) is called from the
+        # I/O thread. reply is None if the command timed out.
+        self.on_reply = on_reply
+        self.queue = collections.deque()
+        self.keys = {}
+        self.inflight = collections.deque()
+        self.buffer = b''
+        self.cond = threading.Condition()
+        self.closing = False
+        self.sent = 0
+        self.replied = 0
+        self.timeouts = 0
+        self.error = None
+        self.serial.timeout = READ_POLL
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def send(self, command, key=None, tag=None):
+        # command is the encoded command, EOL included; tag is handed back
+        # to on_reply. Returns the tag of the queued command this one
+        # replaced, if any.
+        replaced = None
+        with self.cond:
+            if self.error is not None:
+                raise self.error
+            if key is not None and key in self.keys:
+                entry = self.keys[key]
+                replaced = entry[2]
+                entry[0] = command
+                entry[2] = tag
+            else:
+                entry = [command, key, tag]
+                self.queue.append(entry)
+                if key is not None:
+                    self.keys[key] = entry
+            self.cond.notify()
+        return replaced
+
+    def replace(self, command, key, tag=None):
+        # Like send(), but only if a command with the same key is still
+        # queued. Returns (True, tag of the command replaced), or
+        # (False, None) without queueing anything.
+        with self.cond:
+            entry = self.keys.get(key)
+            if entry is None:
+                return False, None
+            replaced = entry[2]
+            entry[0] = command
+            entry[2] = tag
+        return True, replaced
+
+    def idle(self):
+        return not self.queue and not self.inflight
+
+    def settled(self):
+        # Nothing left to do, either done or after an error.
+        return self.idle() or self.error is not None
+
+    def flush(self, timeout=None):
+        # Wait until every queued command has been answered or timed out.
+        with self.cond:
+            done = self.cond.wait_for(self.settled, timeout)
+            if self.error is not None:
+                raise self.error
+            return done
+
+    def close(self, drain=True):
+        # Never raises: an error of the port is left for whoever closes it.
+        with self.cond:
+            if drain:
+                self.cond.wait_for(self.settled)
+            self.closing = True
+            self.cond.notify()
+        self.thread.join()
+
+    def run(self):
+        try:
+            self.loop()
+        except Exception as e:
+            with self.cond:
+                self.error = e
+                self.queue.clear()
+                self.keys.clear()
+                self.inflight.clear()
+                self.cond.notify_all()
+
+    def loop(self):
+        while True:
+            with self.cond:
+                while not self.closing and not self.queue and not self.inflight:
+                    self.cond.wait()
+                if self.closing:
+                    return
+                while self.queue and len(self.inflight) < self.window:
+                    command, key, tag = self.queue.popleft()
+                    if key is not None:
+                        del self.keys[key]
+                    self.write(command, tag)
+            self.read()
+
+    def write(self, command, tag):
+        self.serial.write(command)
+        self.inflight.append((command, time.monotonic(), tag))
+        self.sent += 1
+
+    def read(self):
+        # Wait for a reply to the oldest command in flight.
+        command, t_sent, tag = self.inflight[0]
+        deadline = t_sent + self.timeout
+        while True:
+            line = self.readline(deadline)
+            if line is None:
+                self.drop_late(deadline + self.timeout)
+                self.done(None)
+                return
+            if line:
+                self.done(line)
+                return
+
+    def drop_late(self, deadline):
+        # Wait until deadline for the reply to a command that timed out,
+        # then throw away everything read so far.
+        self.readline(deadline)
+        self.buffer = b''
+        self.serial.reset_input_buffer()
+
+    def readline(self, deadline):
+        # Return the next line without its EOL ('' if it is blank), or None
+        # if the deadline passes first.
+        while True:
+            end = self.buffer.find(self.eol)
+            if end >= 0:
+                line = self.buffer[:end]
+                self.buffer = self.buffer[end+len(self.eol):]
+                return line.strip().decode(errors='replace')
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            data = self.serial.read(max(1, self.serial.in_waiting))
+            self.buffer += data
+
+    def done(self, reply):
+        command, t_sent, tag = self.inflight[0]
+        if self.on_reply is not None:
+            self.on_reply(command, reply, t_sent, time.monotonic() - t_sent,
+                          tag)
+        with self.cond:
+            self.inflight.popleft()
+            if reply is None:
+                self.timeouts += 1
+            else:
+                self.replied += 1
+            self.cond.notify_all()
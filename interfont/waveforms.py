@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Profiles defined by a formula instead of a CSV file, for long periodic or
+# parametric tests. A waveform is a JSON file with its shape, its duration
+# in seconds and the parameters of the shape:
+#
+#   {"shape": "sine", "duration": 86400,
+#    "offset": 12, "amplitude": 0.2, "period": 0.5}
+#
+# Shapes and their parameters (defaults in brackets):
+#   sine        offset [0], amplitude [1], period [1], phase [0] (radians)
+#   square      offset [0], amplitude [1], period [1], duty [0.5], the
+#               fraction of the period at offset + amplitude
+#   sweep       a sine whose frequency goes linearly from start [1] to stop
+#               [10] Hz over the duration, with offset and amplitude
+#   decay       from initial [1] to final [0] with time constant tau [1]
+#   expression  the formula in "expression", of the time t, the other
+#               parameters given, pi, e and the functions in FUNCTIONS, e.g.
+#               "12 + 0.2*sin(2*pi*t/period) + 0.1*square(t, 60, 0.5)"
+#
+# A Waveform is played like a PwlProfile: its points, one per sleep time,
+# are computed as playback reaches them, so a day of ripple costs no more
+# memory than a second of it. sample() gives just the points of a window,
+# for previews. Every point is evaluated once when the waveform is loaded
+# (a sample of them without NumPy), so that a formula that divides by zero
+# or overflows at some t is refused then rather than during playback.
+#
+#   python3 -m interfont.waveforms ripple.json --sleeptime 100 --csv out.csv
+
+import argparse
+import ast
+import functools
+import json
+import math
+import sys
+
+from .profiles import get_numpy
+
+SHAPES = ('sine', 'square', 'sweep', 'decay', 'expression')
+
+# Most points sample() returns, however wide the window
+MAX_SAMPLES = 1 << 18
+
+
+class WaveformError(ValueError):
+    pass
+
+
+def scalar_functions():
+    def where(condition, a, b):
+        return a if condition else b
+
+    def square(t, period, duty=0.5):
+        return 1.0 if (t/period) % 1 < duty else -1.0
+
+    return {"sin": math.sin, "cos": math.cos, "tan": math.tan,
+            "exp": math.exp, "log": math.log, "sqrt": math.sqrt,
+            "abs": abs, "floor": math.floor, "min": min, "max": max,
+            "where": where, "square": square}
+
+
+def array_functions(np):
+    def square(t, period, duty=0.5):
+        return np.where((t/period) % 1 < duty, 1.0, -1.0)
+
+    def where(condition, a, b):
+        return np.where(condition, a, b)
+
+    # np.minimum and np.maximum take two arguments, min and max any number
+    def minimum(*args):
+        return functools.reduce(np.minimum, args)
+
+    def maximum(*args):
+        return functools.reduce(np.maximum, args)
+
+    return {"sin": np.sin, "cos": np.cos, "tan": np.tan,
+            "exp": np.exp, "log": np.log, "sqrt": np.sqrt,
+            "abs": np.abs, "floor": np.floor, "min": minimum,
+            "max": maximum, "where": where, "square": square}
+
+
+FUNCTIONS = tuple(sorted(scalar_functions()))
+CONSTANTS = {"pi": math.pi, "e": math.e}
+
+# The formula of each shape
+FORMULAS = {
+    "sine": "offset + amplitude*sin(2*pi*t/period + phase)",
+    "square": "offset + amplitude*square(t, period, duty)",
+    "sweep": "offset + amplitude*sin(2*pi*(start*t + "
+             "(stop - start)*t*t/(2*duration)))",
+    "decay": "final + (initial - final)*exp(-t/tau)",
+}
+DEFAULTS = {
+    "sine": {"offset": 0, "amplitude": 1, "period": 1, "phase": 0},
+    "square": {"offset": 0, "amplitude": 1, "period": 1, "duty": 0.5},
+    "sweep": {"offset": 0, "amplitude": 1, "start": 1, "stop": 10},
+    "decay": {"initial": 1, "final": 0, "tau": 1},
+    "expression": {},
+}
+
+# Syntax allowed in expressions: arithmetic, comparisons (for where) and
+# calls to FUNCTIONS. Nothing else, attributes and subscripts included.
+NODES = (ast.Expression, ast.BinOp, ast.UnaryOp, ast.Compare, ast.Call,
+         ast.Name, ast.Load, ast.Constant, ast.Add, ast.Sub, ast.Mult,
+         ast.Div, ast.FloorDiv, ast.Mod, ast.Pow, ast.USub, ast.UAdd,
+         ast.Lt, ast.LtE, ast.Gt, ast.GtE)
+
+
+def compile_expression(text, names):
+    # Check an expression and compile it. Numbers become floats, so that
+    # powers overflow instead of growing without bound as integers.
+    try:
+        tree = ast.parse(text, mode='eval')
+    except SyntaxError as e:
+        raise WaveformError('invalid expression {!r}: {}'.format(text, e.msg))
+    for node in ast.walk(tree):
+        if not isinstance(node, NODES):
+            raise WaveformError('{} not allowed in expression {!r}'.format(
+                type(node).__name__, text))
+        if isinstance(node, ast.Constant):
+            if not isinstance(node.value, (int, float)) \
+               or isinstance(node.value, bool):
+                raise WaveformError('{!r} not allowed in expression {!r}'
+                                    .format(node.value, text))
+            node.value = float(node.value)
+        elif isinstance(node, ast.Name) and node.id not in names:
+            raise WaveformError('unknown name {} in expression {!r}'.format(
+                node.id, text))
+        elif isinstance(node, ast.Call):
+            if not isinstance(node.func, ast.Name) \
+               or node.func.id not in FUNCTIONS or node.keywords:
+                raise WaveformError('only calls to {} are allowed in '
+                                    'expression {!r}'.format(
+                                        ', '.join(FUNCTIONS), text))
+    return compile(tree, '<waveform>', 'eval')
+
+
+class Waveform:
+    # A waveform from t = 0 to its duration, played one point every step
+    # seconds. Iterating yields the (t, v) points on demand.
+
+    def __init__(self, definition, step):
+        self.definition = dict(definition)
+        definition = dict(definition)
+        shape = definition.pop("shape", "expression")
+        if shape not in SHAPES:
+            raise WaveformError('unknown shape {!r}, expected one of {}'
+                                .format(shape, ', '.join(SHAPES)))
+        try:
+            self.length = float(definition.pop("duration"))
+        except KeyError:
+            raise WaveformError('the waveform has no duration')
+        if not self.length > 0 or not step > 0:
+            raise WaveformError('the duration and the step must be positive')
+        formula = definition.pop("expression", None)
+        if shape != "expression":
+            formula = FORMULAS[shape]
+        elif formula is None:
+            raise WaveformError('the expression shape needs an expression')
+        self.shape = shape
+        self.step = step
+        self.parameters = dict(DEFAULTS[shape])
+        for name, value in definition.items():
+            if not isinstance(value, (int, float)) or name == "t" \
+               or name in FUNCTIONS or name in CONSTANTS:
+                raise WaveformError('invalid parameter {}: {!r}'.format(
+                    name, value))
+            self.parameters[name] = float(value)
+        self.parameters["duration"] = self.length
+        self.parameters.update(CONSTANTS)
+        self.code = compile_expression(
+            formula, set(self.parameters) | set(FUNCTIONS) | {"t"})
+        self.scalar = dict(scalar_functions(), **self.parameters)
+        self.formula = formula
+        self.value(0)
+        self.check()
+
+    def __reduce__(self):
+        # Pickled as its definition, e.g. to play in another process (see
+        # isolate.py)
+        return Waveform, (self.definition, self.step)
+
+    def value(self, t):
+        self.scalar["t"] = t
+        try:
+            v = float(eval(self.code, {"__builtins__": {}}, self.scalar))
+        except (ArithmeticError, TypeError, ValueError) as e:
+            raise WaveformError('cannot evaluate {!r} at t = {:g}: {}'.format(
+                self.formula, t, e))
+        if not math.isfinite(v):
+            raise WaveformError('{!r} is {} at t = {:g}'.format(
+                self.formula, v, t))
+        return v
+
+    def check(self):
+        # Raise a WaveformError unless every point has a finite value, in
+        # blocks of MAX_SAMPLES points. Without NumPy, only MAX_SAMPLES
+        # points spread over the duration are evaluated.
+        n = len(self)
+        np = get_numpy()
+        if np is None:
+            for k in range(0, n, max(1, -(-n//MAX_SAMPLES))):
+                self.value(k*self.step)
+            return
+        for first in range(0, n, MAX_SAMPLES):
+            ts = np.arange(first, min(n, first + MAX_SAMPLES))*self.step
+            bad = ~np.isfinite(self.values(ts))
+            if bad.any():
+                t = float(ts[np.argmax(bad)])
+                # The scalar error, if there is one, says more
+                self.value(t)
+                raise WaveformError('{!r} is not finite at t = {:g}'.format(
+                    self.formula, t))
+
+    def values(self, ts):
+        # Values at the times of the NumPy array ts.
+        np = get_numpy()
+        names = dict(array_functions(np), **self.parameters)
+        names["t"] = ts
+        with np.errstate(all='ignore'):
+            vs = eval(self.code, {"__builtins__": {}}, names)
+        return np.broadcast_to(np.asarray(vs, dtype=np.float64),
+                               ts.shape).copy()
+
+    def __len__(self):
+        # The points before the duration, which is where the next
+        # repetition starts
+        return max(1, math.ceil(self.length/self.step - 1e-9))
+
+    def __iter__(self):
+        for k in range(len(self)):
+            t = k*self.step
+            yield t, self.value(t)
+
+    def duration(self):
+        return self.length
+
+    def expand(self):
+        np = get_numpy()
+        if np is None:
+            ts = [k*self.step for k in range(len(self))]
+            return ts, [self.value(t) for t in ts]
+        ts = np.arange(len(self))*self.step
+        return ts, self.values(ts)
+
+    def sample(self, t0, t1):
+        # The points between t0 and t1 as NumPy arrays, every step or, for
+        # windows of more than MAX_SAMPLES points, every few steps.
+        np = get_numpy()
+        first = max(0, math.floor(t0/self.step))
+        last = min(len(self), math.ceil(t1/self.step) + 1)
+        if last <= first:
+            return np.empty(0), np.empty(0)
+        stride = max(1, -(-(last - first)//MAX_SAMPLES))
+        ts = np.arange(first, last, stride)*self.step
+        return ts, self.values(ts)
+
+
+def load_waveform(path, step):
+    # Read a waveform definition (see above) to play one point every step
+    # seconds.
+    try:
+        with open(path, 'r') as f:
+            definition = json.load(f)
+    except ValueError as e:
+        raise WaveformError('{} is not valid JSON: {}'.format(path, e))
+    if not isinstance(definition, dict):
+        raise WaveformError('{} does not define a waveform'.format(path))
+    return Waveform(definition, step)
+
+
+def is_waveform(path):
+    return path.lower().endswith('.json')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Check a waveform definition and optionally export its "
+                    "points.")
+    parser.add_argument("waveform", help="waveform definition (JSON)")
+    parser.add_argument("--sleeptime", type=float, default=100,
+                        help="ms between points (default 100)")
+    parser.add_argument("--csv", metavar="FILE",
+                        help="write the points to FILE as a step profile")
+    args = parser.parse_args(argv)
+    try:
+        w = load_waveform(args.waveform, args.sleeptime/1000)
+    except (OSError, WaveformError) as e:
+        print("Error: {}".format(e), file=sys.stderr)
+        return 1
+    print("{}: {} points over {:g} s".format(w.shape, len(w), w.duration()))
+    if args.csv:
+        with open(args.csv, 'w') as f:
+            for t, v in w:
+                f.write('{!r},{!r}\n'.format(t, v))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
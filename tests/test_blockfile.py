@@ -0,0 +1,56 @@
+import io
+import os
+
+from interfont import journal, telemetry
+from interfont.blockfile import BlockWriter, read_blocks
+
+
+def test_blocks_round_trip_and_ignore_cut_tail():
+    f = io.BytesIO()
+    w = BlockWriter(f, 2, block_rows=3)
+    for k in range(7):
+        w.append((k, -k))
+    w.flush()
+    data = f.getvalue()
+    columns, end = read_blocks(data, 0, ('a', 'b'))
+    assert list(columns['a']) == list(range(7))
+    assert list(columns['b']) == [-k for k in range(7)]
+    assert end == len(data)
+    # The last block (one row) cut short
+    columns, end = read_blocks(data[:-4], 0, ('a', 'b'))
+    assert list(columns['a']) == list(range(6))
+    assert end == len(data) - (4 + 8*2)
+
+
+def test_journal_and_telemetry_share_the_format(tmp_path):
+    j = journal.Journal(str(tmp_path / 'run.ifjn'), block_rows=2)
+    j.open(False, 3, 1.0)
+    j.start(0)
+    for i in range(3):
+        j.append(0, i, i/3, i*10)
+    j.close()
+    _, columns, _ = journal.read(j.path)
+    assert list(columns['value']) == [0, 10, 20]
+
+    t = telemetry.TelemetryWriter(str(tmp_path / 'run.iftm'), block_rows=2)
+    for i in range(3):
+        t.append((i, 1, 2, 3))
+    t.close()
+    _, columns, _ = telemetry.read(t.path)
+    assert list(columns['time']) == [0, 1, 2]
+
+
+def test_resumed_telemetry_appends(tmp_path):
+    path = str(tmp_path / 'run.iftm')
+    t = telemetry.TelemetryWriter(path, start=100, block_rows=1)
+    t.append((0, 1, 2, 3))
+    t.close()
+    with open(path, 'ab') as f:
+        f.write(b'\x05\x00') # cut short by a crash
+    t = telemetry.TelemetryWriter(path, start=200, block_rows=1, resume=True)
+    t.append((5, 1, 2, 3))
+    t.close()
+    start, columns, end = telemetry.read(path)
+    assert start == 100
+    assert list(columns['time']) == [0, 5]
+    assert end == os.path.getsize(path)
@@ -0,0 +1,13 @@
+from interfont.compiler import compile_series
+
+
+def test_keeps_the_end_of_a_final_hold():
+    p = compile_series([0, 0.5, 3], [0, 5, 5], 'PV {:06.3f}')
+    assert list(p.times) == [0, 0.5, 3]
+    assert p.command(2) == p.command(1) == b'PV 05.000\r'
+
+
+def test_merges_repeated_commands_before_the_end():
+    p = compile_series([0, 1, 2, 3], [1, 1.0001, 2, 2], 'PV {:06.3f}')
+    assert list(p.times) == [0, 2, 3]
+    assert p.saved() == 1
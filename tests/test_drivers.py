@@ -0,0 +1,43 @@
+import json
+from pathlib import Path
+
+import pytest
+
+from interfont import drivers, engine
+
+CONFIGS = Path(__file__).resolve().parent.parent / 'configs'
+
+
+def zplus_config():
+    with open(CONFIGS / 'lambdaZ60-14.json') as f:
+        return json.load(f)
+
+
+def test_only_list_drivers_upload():
+    assert not hasattr(drivers.get_driver({}), 'upload')
+    assert not hasattr(drivers.get_driver({"driver": "lambda-genesys"}),
+                       'upload')
+    assert drivers.get_driver(zplus_config()).can(drivers.LIST)
+
+
+def test_default_period_uploads():
+    pytest.importorskip('serial')
+    config = zplus_config()
+    driver = drivers.get_driver(config)
+    sim = driver.simulated(latency=0.002).start()
+    try:
+        config["port"] = sim.port
+        e = engine.PlaybackEngine(config, [0, 0.2, 0.4], [1, 2, 3])
+        e.run()
+        events = []
+        while not e.events.empty():
+            events.append(e.events.get())
+        assert events[-1] == (engine.DONE, True)
+        played = [c for _, _, c in sim.log if c.startswith('PV ')]
+        lists = sim.supplies[0].lists
+    finally:
+        sim.close()
+    # The last point lasts one sleep time instead of nothing
+    assert lists['DWEL'] == [0.2, 0.2, 0.1]
+    assert lists['VOLT'] == [1, 2, 3]
+    assert played[-4:-1] == ['PV 1.0', 'PV 2.0', 'PV 3.0']
@@ -0,0 +1,18 @@
+import time
+
+from interfont.journal import Journal, read
+
+
+def test_tick_writes_rows_older_than_block_age(tmp_path):
+    path = str(tmp_path / 'run.ifjn')
+    j = Journal(path, block_age=1.0)
+    j.open(False, 3, 6.0)
+    t0 = time.monotonic()
+    j.start(t0)
+    j.append(0, 0, t0, 1.0)
+    j.tick(time.monotonic())
+    assert len(read(path)[1]['index']) == 0
+    # While waiting for the next point, not when it is applied
+    j.tick(time.monotonic() + 1.0)
+    assert list(read(path)[1]['value']) == [1.0]
+    j.close()
@@ -0,0 +1,50 @@
+from interfont.simplify import simplify, step_deviation
+
+
+def edges(dt=0.02):
+    # Steps sampled every dt seconds, with edges off the 0.1 s grid and a
+    # drop on the last sample, like current_profile.csv
+    levels = [(0, 2.64), (1.06, 3.1), (2.5, 1.63), (4.08, 1.63)]
+    ts, vs = [], []
+    for k in range(int(round(4.1/dt)) + 1):
+        t = round(k*dt, 10)
+        ts.append(t)
+        vs.append(0.0 if k*dt >= 4.1 - 1e-9
+                  else [v for start, v in levels if start <= t + 1e-9][-1])
+    return ts, vs
+
+
+def test_ramps_within_tolerance_on_step_edges():
+    ts, vs = edges()
+    for min_interval in (0.1, 0.02):
+        out_ts, out_vs, deviation = simplify(ts, vs, 0.05, min_interval,
+                                             'ramps')
+        assert deviation <= 0.05
+        assert step_deviation(ts, vs, out_ts, out_vs) <= 0.05
+        assert all(b - a >= min_interval - 1e-9
+                   for a, b in zip(out_ts, out_ts[1:]))
+
+
+def test_steps_within_tolerance_on_step_edges():
+    ts, vs = edges()
+    out_ts, out_vs, deviation = simplify(ts, vs, 0.05, 0.1, 'steps')
+    assert deviation <= 0.05
+
+
+def test_ramps_within_tolerance_on_bundled_profile():
+    from pathlib import Path
+    from interfont.profiles import load_profile
+    path = Path(__file__).resolve().parent.parent / 'current_profile.csv'
+    ts, vs = load_profile(str(path), False, 0.1)
+    assert simplify(ts, vs, 0.05, 0.1, 'ramps')[2] <= 0.05
+
+
+def test_steps_keep_a_final_hold():
+    out_ts, out_vs, deviation = simplify([0, 1, 10], [0, 5, 5], 0.1, 0.1,
+                                         'steps')
+    assert out_ts[-1] == 10 and out_vs[-1] == 5
+    assert deviation == 0
+
+
+def test_deviation_counts_a_missing_tail():
+    assert step_deviation([0, 1, 10], [0, 5, 5], [0, 1], [0, 5]) == 5
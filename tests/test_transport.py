@@ -0,0 +1,23 @@
+import pytest
+
+from interfont.simulator import SimulatedSupply
+from interfont.transport import Transport
+
+
+def test_late_replies_are_not_taken_for_the_next():
+    serial = pytest.importorskip('serial')
+    sim = SimulatedSupply(latency=0.008).start()
+    port = serial.Serial(sim.port, 9600)
+    replies = []
+    t = Transport(port, timeout=0.005,
+                  on_reply=lambda c, r, *_: replies.append((c, r)))
+    try:
+        for c in (b'ADR 0\r', b'IDN?\r', b'PV?\r', b'PV 1.0\r', b'PV?\r'):
+            t.send(c)
+            t.flush()
+    finally:
+        t.close()
+        port.close()
+        sim.close()
+    # Every reply comes after the timeout: none may be matched to a command
+    assert replies and all(r is None for _, r in replies)
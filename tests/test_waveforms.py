@@ -0,0 +1,34 @@
+import pickle
+
+import pytest
+
+from interfont.waveforms import Waveform, WaveformError
+
+
+@pytest.mark.parametrize('expression', ['1/(t-5)', 'exp(t)', 'sqrt(5-t)'])
+def test_refuses_formula_failing_later(expression):
+    # Fine at t = 0, not at some later point of the duration
+    with pytest.raises(WaveformError, match='t = '):
+        Waveform({"expression": expression, "duration": 1000}, 0.1)
+
+
+def test_value_error_names_t():
+    w = Waveform({"expression": "1/(t-5)", "duration": 4}, 0.1)
+    with pytest.raises(ValueError, match='t = 5'):
+        w.value(5)
+
+
+def test_pickles_as_definition():
+    w = Waveform({"shape": "sine", "duration": 86400, "offset": 12}, 0.01)
+    copy = pickle.loads(pickle.dumps(w))
+    assert len(copy) == len(w) == 8640000
+    assert copy.value(0.25) == w.value(0.25)
+
+
+@pytest.mark.parametrize('expression, expected', [
+    ('min(t, 5, 3)', [0, 3, 3]), ('max(t, 5, 3)', [5, 5, 7])])
+def test_min_max_take_any_number_of_arguments(expression, expected):
+    w = Waveform({"expression": expression, "duration": 10}, 1)
+    assert [w.value(t) for t in (0, 4, 7)] == expected
+    np = pytest.importorskip('numpy')
+    assert list(w.values(np.array([0.0, 4.0, 7.0]))) == expected